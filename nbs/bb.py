@@ -1,83 +1,97 @@
 import os
-import csv
 import nbs.lms as lms
 import pyarrow as pa
-import pyarrow.parquet as pq
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
+from src.chunkstore import ChunkStore
+from src.embparts import EmbeddingCheckpoint, embedding_schema
 
-def embed_texts(model_key, texts):
+COLUMNS = ["topic", "pdf_name", "chunk_id", "chunk_text", "token_count"]
+
+# Loaded once per worker process by init_worker
+_model = None
+
+def init_worker(model_key):
+    global _model
+    _model = lms.embedding_model(model_key)
+
+def embed_texts(texts):
     """Worker function: embed a small list of texts."""
-    model = lms.embedding_model(model_key)
-    embeddings = [model.embed(t) for t in texts]
+    embeddings = [_model.embed(t) for t in texts]
     return embeddings
 
 class ArxivEmbeddingFastAdderWithProgress:
     def __init__(
         self,
         save_dir="arxiv_data",
-        chunk_csv="all_chunks.csv",
+        chunk_store="all_chunks",
         model_key="text-embedding-qwen3-embedding-4b",
         batch_size=32,
-        num_workers=4
+        num_workers=4,
+        part_rows=4096
     ):
         self.save_dir = save_dir
-        self.chunk_csv = os.path.join(save_dir, chunk_csv)
+        self.store = ChunkStore(os.path.join(save_dir, chunk_store))
         self.output_parquet = os.path.join(save_dir, "all_chunks_with_embeddings.parquet")
         self.model_key = model_key
         self.batch_size = batch_size
         self.num_workers = num_workers
+        self.part_rows = part_rows
+        # Committed part-files of an interrupted run; compacted into output_parquet at the end
+        self.parts_dir = os.path.join(save_dir, "embedding_parts_fast")
 
     def run(self):
-        if not os.path.exists(self.chunk_csv):
-            print(f"Error: {self.chunk_csv} not found.")
+        if not self.store.topics():
+            print(f"Error: {self.store.root} not found.")
             return
 
-        # Read all chunk rows
-        rows = []
-        with open(self.chunk_csv, newline="", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                rows.append(row)
+        # Read all chunk rows from the stage-03 chunk store
+        rows = self.store.read(columns=COLUMNS).to_pylist()
+
+        # Skip chunks already committed by an interrupted run
+        checkpoint = EmbeddingCheckpoint(self.parts_dir, self.model_key)
+        done = checkpoint.done_keys()
+        rows = [r for r in rows if (r["topic"], r["chunk_id"]) not in done]
 
         total = len(rows)
-        print(f"Total chunks to embed: {total}")
+        print(f"Total chunks to embed: {total} ({len(done)} already done)")
 
-        writer = None
+        pending = []
 
-        # Use tqdm to track the batch progress
-        for batch_start in tqdm(range(0, total, self.batch_size), desc="Embedding batches"):
-            batch = rows[batch_start : batch_start + self.batch_size]
-            texts = [r["chunk_text"] for r in batch]
+        # One pool for the whole run; each worker loads the model once
+        with ProcessPoolExecutor(
+            max_workers=self.num_workers, initializer=init_worker, initargs=(self.model_key,)
+        ) as executor:
+            # Use tqdm to track the batch progress
+            for batch_start in tqdm(range(0, total, self.batch_size), desc="Embedding batches"):
+                batch = rows[batch_start : batch_start + self.batch_size]
+                texts = [r["chunk_text"] for r in batch]
 
-            # Parallel embedding
-            with ProcessPoolExecutor(max_workers=self.num_workers) as executor:
+                # Parallel embedding
                 splits = []
-                size_per_worker = max(1, len(texts) // self.num_workers)
+                size_per_worker = -(-len(texts) // self.num_workers)
                 for i in range(self.num_workers):
                     s = texts[i * size_per_worker : (i + 1) * size_per_worker]
                     if s:
                         splits.append(s)
-                future_to_split = {executor.submit(embed_texts, self.model_key, s): s for s in splits}
+                # map() returns results in submission order, so embeddings line up with rows
                 embeddings = []
-                for future in as_completed(future_to_split):
-                    embeddings.extend(future.result())
-
-            # Combine rows with embeddings
-            for i, r in enumerate(batch):
-                r["embedding"] = embeddings[i]
-
-            # Convert batch to PyArrow table
-            table = pa.Table.from_pydict({k: [r[k] for r in batch] for k in batch[0].keys()})
-
-            if writer is None:
-                schema = table.schema
-                writer = pq.ParquetWriter(self.output_parquet, schema=schema, compression="SNAPPY")
-
-            writer.write_table(table)
-
-        if writer:
-            writer.close()
+                for result in executor.map(embed_texts, splits):
+                    embeddings.extend(result)
+
+                # Combine rows with embeddings
+                for i, r in enumerate(batch):
+                    r["embedding"] = embeddings[i]
+
+                # Commit a part-file every part_rows rows, typed like stage 04's output
+                pending.extend(batch)
+                if len(pending) >= self.part_rows or batch_start + self.batch_size >= total:
+                    schema = embedding_schema(len(pending[0]["embedding"]))
+                    checkpoint.commit(pa.Table.from_pylist(pending, schema=schema))
+                    pending = []
+
+        checkpoint.finalize(self.output_parquet)
+        checkpoint.remove()
         print(f"✅ Fast embeddings saved to {self.output_parquet}")
 
 if __name__ == "__main__":
@@ -14,9 +14,16 @@ class EmbeddingGenerator:
     and saves enriched dataset with embeddings.
     """
 
-    def __init__(self, api_url="http://localhost:1234/v1/embeddings", model="embedding-model"):
+    def __init__(self, api_url="http://localhost:1234/v1/embeddings", model="embedding-model", cache=None):
+        """
+        :param cache: Optional EmbeddingCache (src/embcache.py); texts already
+                      embedded with this model are not sent to the API again.
+        """
         self.api_url = api_url
         self.model = model
+        self.cache = cache
+        # One keep-alive connection for every request
+        self.session = requests.Session()
 
     def load_dataset(self, path: str) -> pd.DataFrame:
         if path.endswith(".csv"):
@@ -30,17 +37,32 @@ class EmbeddingGenerator:
         return df
 
     def get_embedding(self, text: str) -> List[float]:
+        if self.cache is not None:
+            return self.cache.embed(self.model, [text], self.get_embeddings)[0].tolist()
         payload = {"model": self.model, "input": text}
-        response = requests.post(self.api_url, json=payload)
+        response = self.session.post(self.api_url, json=payload)
         response.raise_for_status()
         data = response.json()
         return data["data"][0]["embedding"]
 
-    def create_embeddings(self, df: pd.DataFrame, text_col: str = "text") -> pd.DataFrame:
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Embed a list of texts in one request."""
+        payload = {"model": self.model, "input": texts}
+        response = self.session.post(self.api_url, json=payload)
+        response.raise_for_status()
+        data = response.json()
+        return [item["embedding"] for item in sorted(data["data"], key=lambda item: item["index"])]
+
+    def create_embeddings(self, df: pd.DataFrame, text_col: str = "text", batch_size: int = 64) -> pd.DataFrame:
+        if self.cache is not None:
+            # One bulk cache lookup; only the misses go to the API
+            df["embedding"] = self.cache.embed(self.model, df[text_col].tolist(), self.get_embeddings).tolist()
+            return df
+
+        texts = df[text_col].tolist()
         embeddings = []
-        for txt in df[text_col].tolist():
-            emb = self.get_embedding(txt)
-            embeddings.append(emb)
+        for start in range(0, len(texts), batch_size):
+            embeddings.extend(self.get_embeddings(texts[start:start + batch_size]))
         df["embedding"] = embeddings
         return df
 
@@ -68,8 +90,16 @@ class UMAPProjector:
     def __init__(self, n_components=2, random_state=42, metric="cosine"):
         self.umap = UMAP(n_components=n_components, random_state=random_state, metric=metric)
 
-    def project(self, df: pd.DataFrame, embedding_col="embedding") -> pd.DataFrame:
-        embeddings = np.array(df[embedding_col].tolist())
+    def project(self, df: pd.DataFrame, embedding_col="embedding", matrix=None) -> pd.DataFrame:
+        """
+        :param matrix: Embeddings aligned with df rows, instead of df[embedding_col]: an
+                       array, or an EmbeddingMatrix (src/embmatrix.py) whose memory-mapped
+                       .npy is used without building Python lists (df = matrix.index().to_pandas()).
+        """
+        if matrix is not None:
+            embeddings = matrix.dense() if hasattr(matrix, "dense") else matrix
+        else:
+            embeddings = np.array(df[embedding_col].tolist())
         projections = self.umap.fit_transform(embeddings)
         for i in range(projections.shape[1]):
             df[f"umap_{i+1}"] = projections[:, i]
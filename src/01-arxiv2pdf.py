@@ -1,82 +1,310 @@
 import arxiv
 import os
-import csv
+import threading
+import time
+from collections import Counter
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from manifest import DownloadManifest
+from store import PDFStore, sha256_file
+from fetch import stream_download, is_complete_pdf, DownloadError
+
+
+class TokenBucket:
+    """Thread-safe token bucket shared by every request the downloader makes."""
+
+    def __init__(self, rate: float, capacity: int = 1):
+        """
+        :param rate: Tokens added per second (e.g., 1/3 for one request every three seconds).
+        :param capacity: Maximum burst size.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then consume it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
 
 class ArxivPDFDownloader:
-    def __init__(self, topics: list, papers_per_topic: int = 5, save_dir: str = "downloads"):
+    def __init__(
+        self,
+        topics: list,
+        papers_per_topic: int = 5,
+        save_dir: str = "downloads",
+        max_workers: int = 1,
+        requests_per_second: float = 1 / 3,
+        burst: int = 1,
+        client: arxiv.Client = None,
+        download_retries: int = 5,
+        retry_backoff: float = 2.0,
+    ):
         """
         Initialize the downloader.
 
         :param topics: List of arXiv categories or queries (e.g., ["cs.LG", "astro-ph.CO"]).
         :param papers_per_topic: Number of papers per topic.
         :param save_dir: Root directory to save PDFs and metadata.
+        :param max_workers: Number of in-flight downloads; 1 keeps the sequential behaviour.
+        :param requests_per_second: Rate shared by all workers (arXiv asks for one request every 3s).
+        :param burst: Number of requests allowed back-to-back before the rate applies.
+        :param client: arxiv.Client used for searches; point its query_url_format elsewhere to use a stand-in API.
+        :param download_retries: Retries per PDF for transient HTTP/network errors.
+        :param retry_backoff: Base delay in seconds for exponential retry backoff.
         """
         self.topics = topics
         self.papers_per_topic = papers_per_topic
         self.save_dir = save_dir
+        self.max_workers = max_workers
+        self.rate_limiter = TokenBucket(requests_per_second, burst)
+        self.client = client or arxiv.Client()
+        self.download_retries = download_retries
+        self.retry_backoff = retry_backoff
+
+        # (arxiv_id, seconds, retries, ok) per attempted download, for benchmarking
+        self.download_stats = []
 
         os.makedirs(self.save_dir, exist_ok=True)
+        self.manifest = DownloadManifest(os.path.join(self.save_dir, "manifest.sqlite"))
+        self.store = PDFStore(os.path.join(self.save_dir, "store"))
+        self.paper_locks = {}
+        self.paper_locks_guard = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(max_workers, 10))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
 
     def search(self, query, max_results):
         """Search arXiv for a given query."""
-        return arxiv.Search(
+        return self.client.results(arxiv.Search(
             query=query,
             max_results=max_results,
             sort_by=arxiv.SortCriterion.SubmittedDate
-        ).results()
+        ))
+
+    def _prepare_topic(self, topic):
+        """Create the topic folders and seed the manifest from a legacy metadata.csv; return (pdf_dir, meta_file)."""
+        topic_dir = os.path.join(self.save_dir, topic.replace(".", "_"))
+        pdf_dir = os.path.join(topic_dir, "pdfs")
+        os.makedirs(pdf_dir, exist_ok=True)
+
+        meta_file = os.path.join(topic_dir, "metadata.csv")
+
+        # Older runs appended to metadata.csv; fold it into the manifest once
+        if os.path.exists(meta_file) and self.manifest.count(topic) == 0:
+            imported = self.manifest.import_csv(topic, meta_file)
+            print(f"Imported {imported} rows from {meta_file} into manifest")
+
+        return pdf_dir, meta_file
+
+    def _metadata_row(self, result, filepath):
+        return [
+            result.get_short_id(),
+            result.title.strip().replace("\n", " "),
+            "; ".join([a.name for a in result.authors]),
+            result.published.strftime("%Y-%m-%d"),
+            result.updated.strftime("%Y-%m-%d"),
+            " ".join(result.categories),
+            result.summary.strip().replace("\n", " "),
+            filepath
+        ]
+
+    def _download_one(self, result, filepath):
+        """
+        Stream a single PDF to filepath unless a valid copy is already there.
+
+        Partial downloads are kept as `<filepath>.part` and resumed on the
+        next attempt; filepath only appears once the PDF has been validated.
+        """
+        filename = os.path.basename(filepath)
+        if os.path.exists(filepath) and is_complete_pdf(filepath):
+            print(f"Already exists: {filename}")
+            return
+
+        resuming = " (resuming)" if os.path.exists(filepath + ".part") else ""
+        print(f"Downloading {result.title} -> {filename}{resuming}")
+
+        started = time.perf_counter()
+        try:
+            retries = stream_download(
+                result.pdf_url, filepath,
+                session=self.session,
+                rate_limiter=self.rate_limiter,
+                retries=self.download_retries,
+                backoff=self.retry_backoff,
+            )
+        except DownloadError:
+            self.download_stats.append((result.get_short_id(), time.perf_counter() - started, self.download_retries, False))
+            raise
+        self.download_stats.append((result.get_short_id(), time.perf_counter() - started, retries, True))
+
+    def _paper_lock(self, arxiv_id):
+        with self.paper_locks_guard:
+            return self.paper_locks.setdefault(arxiv_id, threading.Lock())
+
+    def _fetch_blob(self, result, filepath):
+        """
+        Make sure the paper is in the PDF store and linked at filepath.
+
+        A paper cross-listed under several topics is fetched once; the other
+        topics get a hardlink to the same blob.
+        """
+        arxiv_id = result.get_short_id()
+        with self._paper_lock(arxiv_id):
+            blob = self.manifest.blob_for(arxiv_id)
+            if blob is not None and os.path.exists(blob[2]):
+                print(f"Linking stored copy: {arxiv_id}.pdf")
+            elif os.path.exists(filepath) and is_complete_pdf(filepath):
+                # PDF from an older run without the store; adopt it as the blob
+                blob = self.store.put(filepath)
+                self.manifest.record_blob(arxiv_id, *blob)
+            else:
+                incoming = self.store.incoming_path(arxiv_id)
+                self._download_one(result, incoming)
+                blob = self.store.put(incoming, move=True)
+                self.manifest.record_blob(arxiv_id, *blob)
+
+            self.store.link(blob[2], filepath)
+
+    def _process_result(self, topic, result, pdf_dir):
+        """
+        Fetch one search result and record it in the manifest.
+
+        Returns the metadata row, or None when the manifest already has the
+        paper for this topic and its PDF is on disk.
+        """
+        arxiv_id = result.get_short_id()
+        filepath = os.path.join(pdf_dir, f"{arxiv_id}.pdf")
+
+        if self.manifest.has(topic, arxiv_id) and os.path.exists(filepath):
+            print(f"Already exists: {arxiv_id}.pdf")
+            return None
+
+        try:
+            self._fetch_blob(result, filepath)
+        except DownloadError as e:
+            # Leave it out of the manifest; the next run resumes from the .part file
+            print(f"⚠️ Download failed for {arxiv_id}: {e}")
+            return None
+
+        row = self._metadata_row(result, filepath)
+        self.manifest.upsert(topic, row)
+        return row
+
+    def verify_pdfs(self):
+        """
+        Re-verify every stored PDF against its recorded size and sha256 and
+        the PDF header/trailer. Papers with a corrupt blob lose their topic
+        links and are dropped from the manifest, so the next download_pdfs
+        run fetches them again; the blob itself is removed once no other
+        paper in the manifest references it.
+
+        :return: List of arxiv_ids that were invalidated.
+        """
+        topics_by_paper = self.manifest.topics_by_paper()
+        blobs = self.manifest.blobs()
+        # Identical PDFs share one content-addressed blob; only delete it once no paper uses it
+        references = Counter(blob_path for _, _, _, blob_path in blobs)
+        invalid = []
+
+        for arxiv_id, sha256, size, blob_path in blobs:
+            ok = (
+                is_complete_pdf(blob_path, expected_size=size)
+                and sha256_file(blob_path) == sha256
+            )
+            if ok:
+                continue
+
+            print(f"⚠️ Corrupt or missing PDF: {arxiv_id}")
+            references[blob_path] -= 1
+            paths = [pdf_path for _, pdf_path in topics_by_paper.get(arxiv_id, [])]
+            if not references[blob_path]:
+                paths.append(blob_path)
+            for path in paths:
+                if os.path.exists(path):
+                    os.remove(path)
+            self.manifest.invalidate(arxiv_id)
+            invalid.append(arxiv_id)
+
+        print(f"✅ Verified {len(blobs)} stored PDFs, {len(invalid)} invalidated")
+        return invalid
+
+    def _finish_topic(self, topic, pdf_dir, meta_file, new_rows):
+        # metadata.csv is a compatibility export; only rewrite it when something changed
+        if new_rows or not os.path.exists(meta_file):
+            self.manifest.export_csv(topic, meta_file)
+        print(f"✅ Completed topic: {topic} ({new_rows} new). PDFs in {pdf_dir}, metadata in {meta_file}")
 
     def download_pdfs(self):
         """
-        Download PDFs topic-wise and save metadata.
+        Download PDFs topic-wise and record metadata in the manifest.
         """
+        if self.max_workers > 1:
+            return self._download_pdfs_concurrent()
+
         for topic in self.topics:
-            topic_dir = os.path.join(self.save_dir, topic.replace(".", "_"))
-            pdf_dir = os.path.join(topic_dir, "pdfs")
-            os.makedirs(pdf_dir, exist_ok=True)
+            pdf_dir, meta_file = self._prepare_topic(topic)
+
+            print(f"\n🔍 Searching {self.papers_per_topic} papers for topic: {topic}")
+            self.rate_limiter.acquire()
 
-            meta_file = os.path.join(topic_dir, "metadata.csv")
+            new_rows = 0
+            for result in self.search(topic, self.papers_per_topic):
+                if self._process_result(topic, result, pdf_dir) is not None:
+                    new_rows += 1
 
-            # If metadata file doesn't exist, create it with headers
-            if not os.path.exists(meta_file):
-                with open(meta_file, mode="w", newline="", encoding="utf-8") as f:
-                    writer = csv.writer(f)
-                    writer.writerow([
-                        "arxiv_id", "title", "authors", "published",
-                        "updated", "categories", "abstract", "pdf_path"
-                    ])
+            self._finish_topic(topic, pdf_dir, meta_file, new_rows)
 
-            print(f"\n🔍 Searching {self.papers_per_topic} papers for topic: {topic}")
+    def _download_pdfs_concurrent(self):
+        """
+        Same output as the sequential path, but up to `max_workers` PDFs are in
+        flight at once. Every search and download draws from the shared token
+        bucket, so the aggregate request rate stays within arXiv's limits.
+        """
+        lock = threading.Lock()
+
+        def run_topic(topic, pool):
+            pdf_dir, meta_file = self._prepare_topic(topic)
 
-            with open(meta_file, mode="a", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
+            print(f"\n🔍 Searching {self.papers_per_topic} papers for topic: {topic}")
+            self.rate_limiter.acquire()
+            results = list(self.search(topic, self.papers_per_topic))
 
-                for result in self.search(topic, self.papers_per_topic):
-                    arxiv_id = result.get_short_id()
-                    filename = f"{arxiv_id}.pdf"
-                    filepath = os.path.join(pdf_dir, filename)
+            done = 0
 
-                    # Download PDF if not already present
-                    if not os.path.exists(filepath):
-                        print(f"Downloading {result.title} -> {filename}")
-                        result.download_pdf(filename=filepath)
-                    else:
-                        print(f"Already exists: {filename}")
+            def fetch(result):
+                nonlocal done
+                try:
+                    return self._process_result(topic, result, pdf_dir)
+                finally:
+                    with lock:
+                        done += 1
+                        print(f"[{topic}] {done}/{len(results)} papers")
 
-                    # Collect metadata
-                    metadata = [
-                        arxiv_id,
-                        result.title.strip().replace("\n", " "),
-                        "; ".join([a.name for a in result.authors]),
-                        result.published.strftime("%Y-%m-%d"),
-                        result.updated.strftime("%Y-%m-%d"),
-                        " ".join(result.categories),
-                        result.summary.strip().replace("\n", " "),
-                        filepath
-                    ]
+            futures = [pool.submit(fetch, r) for r in results]
+            new_rows = sum(1 for future in futures if future.result() is not None)
 
-                    writer.writerow(metadata)
+            self._finish_topic(topic, pdf_dir, meta_file, new_rows)
 
-            print(f"✅ Completed topic: {topic}. PDFs in {pdf_dir}, metadata in {meta_file}")
+        # Topics are searched in parallel; their downloads share one bounded pool.
+        with ThreadPoolExecutor(max_workers=self.max_workers) as download_pool:
+            with ThreadPoolExecutor(max_workers=len(self.topics) or 1) as topic_pool:
+                futures = [topic_pool.submit(run_topic, t, download_pool) for t in self.topics]
+                for future in futures:
+                    future.result()
 
 
 if __name__ == "__main__":
@@ -88,5 +316,6 @@ if __name__ == "__main__":
         "q-bio.BM", "q-bio.NC", "q-fin.PR", "econ.EM", "physics.soc-ph"
     ]
 
-    downloader = ArxivPDFDownloader(topics=topics, papers_per_topic=5, save_dir="arxiv_data")
+    downloader = ArxivPDFDownloader(topics=topics, papers_per_topic=5, save_dir="arxiv_data", max_workers=4)
     downloader.download_pdfs()
+    downloader.verify_pdfs()
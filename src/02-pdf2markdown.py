@@ -95,83 +95,524 @@
 import arxiv
 import os
 import csv
+import time
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
 from docling.document_converter import DocumentConverter
 from docling.datamodel.pipeline_options import PdfPipelineOptions
 from docling.datamodel.base_models import InputFormat
 from docling.document_converter import PdfFormatOption
+from store import link_or_copy
+from fetch import is_complete_pdf
+from convcache import ConversionCache, options_fingerprint, docling_version
+from fastpath import FastPathExtractor
+from convd import ConversionClient
 
 
-class ArxivRecoveryGenerator:
-    def __init__(self, save_dir: str = "downloads"):
-        self.save_dir = save_dir
+def build_pipeline_options():
+    return PdfPipelineOptions(
+        do_ocr=False,
+        generate_page_images=False,
+        generate_picture_images=False,
+        do_picture_classification=False,
+        do_picture_description=False,
+    )
 
-        pipeline_options = PdfPipelineOptions(
-            do_ocr=False,
-            generate_page_images=False,
-            generate_picture_images=False,
-            do_picture_classification=False,
-            do_picture_description=False,
-        )
 
-        self.converter = DocumentConverter(
-            format_options={
-                InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)
-            }
-        )
+def build_converter(pipeline_options):
+    return DocumentConverter(
+        format_options={
+            InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)
+        }
+    )
+
+
+# Per-process converter and fast-path extractor for the parallel mode; built once by _init_worker
+_worker_converter = None
+_worker_fast_path = None
+
+
+def write_markdown(content, md_path):
+    """Write via a temp file so a hardlinked copy (cache entry, other topic) is never truncated in place."""
+    tmp_path = md_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, md_path)
+
+
+def _init_worker(pipeline_options, fast_path=None):
+    global _worker_converter, _worker_fast_path
+    _worker_converter = build_converter(pipeline_options)
+    _worker_fast_path = fast_path
+
+
+def count_pages(pdf_path):
+    import pypdfium2 as pdfium
+
+    pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def page_ranges(num_pages, shard_pages):
+    """Split 1..num_pages into inclusive (start, end) ranges of at most shard_pages pages."""
+    return [(start, min(start + shard_pages - 1, num_pages)) for start in range(1, num_pages + 1, shard_pages)]
+
+
+def convert_pdf(converter, pdf_path, page_range=None):
+    """
+    Convert a whole PDF, or an inclusive 1-based page range of it, to markdown.
+
+    Page-range shards are rendered page by page behind `<!-- page N -->`
+    markers so they can be concatenated back into one document in order.
+    """
+    if page_range is None:
+        return converter.convert(pdf_path).document.export_to_markdown()
+
+    start, end = page_range
+    document = converter.convert(pdf_path, page_range=page_range).document
+    return "\n\n".join(
+        f"<!-- page {page_no} -->\n\n{document.export_to_markdown(page_no=page_no)}"
+        for page_no in range(start, end + 1)
+    )
+
+
+def _convert_in_worker(pdf_path, tier="docling", page_range=None):
+    """
+    Run one task in a pool worker: the fast-path text extraction for a whole
+    PDF, or a docling conversion of a PDF (or one shard of it).
+
+    :return: (markdown, error, metrics). A fast-path task that fails the
+             quality check returns no markdown and no error (escalate); one
+             that raises is escalated too. Errors are returned, not raised, so
+             one bad document can't sink the batch.
+    """
+    started = time.perf_counter()
+    try:
+        if tier == "fast":
+            markdown, metrics = _worker_fast_path.extract(pdf_path)
+        else:
+            markdown, metrics = convert_pdf(_worker_converter, pdf_path, page_range), {}
+        metrics["seconds"] = time.perf_counter() - started
+        return markdown, None, metrics
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}", {"seconds": time.perf_counter() - started}
+
+
+class ArxivRecoveryGenerator:
+    def __init__(
+        self,
+        save_dir: str = "downloads",
+        num_workers: int = 1,
+        max_docs_per_worker: int = 50,
+        cache_max_bytes: int = 5 * 1024 ** 3,
+        shard_pages: int = 24,
+        shard_threshold_pages: int = 60,
+        fast_path: FastPathExtractor = None,
+        converter_url: str = None,
+    ):
+        """
+        :param save_dir: Root directory containing topic subfolders with pdfs/.
+        :param num_workers: Conversion processes for recover_all; 1 converts in-process.
+        :param max_docs_per_worker: Recycle each worker after this many documents to bound memory.
+        :param cache_max_bytes: Size bound for the markdown conversion cache.
+        :param shard_pages: Pages per shard when a large PDF is split.
+        :param shard_threshold_pages: Split PDFs with more pages than this into shards
+                                      converted in parallel; None disables sharding.
+        :param fast_path: FastPathExtractor to try before docling; documents whose
+                          text layer fails its quality check are escalated.
+        :param converter_url: URL of a running ConversionDaemon (convd.py). When set,
+                              docling conversions are sent there (num_workers at a
+                              time) instead of loading models in this process.
+        """
+        self.save_dir = save_dir
+        self.num_workers = num_workers
+        self.max_docs_per_worker = max_docs_per_worker
+        self.shard_pages = shard_pages
+        self.shard_threshold_pages = shard_threshold_pages
+        self.fast_path = fast_path
+        self.tier_counts = Counter()
+        self.tier_seconds = Counter()
+
+        self.pipeline_options = build_pipeline_options()
+        self.cache = ConversionCache(os.path.join(save_dir, "cache", "conversion"), max_bytes=cache_max_bytes)
+
+        # Only the serial path converts in this process; it builds the converter on first use
+        self.converter = None
+        if converter_url:
+            # The daemon's options and docling version decide the output, so key the cache on them
+            self.client = ConversionClient(converter_url)
+            health = self.client.health()
+            self.options_hash = health["options_hash"]
+            self.docling_version = health["docling_version"]
+        else:
+            self.client = None
+            self.options_hash = options_fingerprint(self.pipeline_options)
+            self.docling_version = docling_version()
+
+        if fast_path is not None:
+            self.options_hash += ":" + fast_path.fingerprint()
 
     def save_markdown(self, content, filename):
-        with open(filename, "w", encoding="utf-8") as f:
-            f.write(content)
+        write_markdown(content, filename)
 
-    def recover_from_pdfs(self, topic):
+    def _topic_dirs(self, topic):
         topic_dir = os.path.join(self.save_dir, topic.replace(".", "_"))
         pdf_dir = os.path.join(topic_dir, "pdfs")
         md_dir = os.path.join(topic_dir, "markdown")
         os.makedirs(md_dir, exist_ok=True)
+        return topic_dir, pdf_dir, md_dir
+
+    def _shard_plan(self, pdf_path):
+        """Page ranges to convert separately, or None to convert the PDF in one piece."""
+        if not self.shard_threshold_pages:
+            return None
+        num_pages = self.cache.pdf_pages(pdf_path, count_pages)
+        if num_pages is None or num_pages <= self.shard_threshold_pages:
+            return None
+        return page_ranges(num_pages, self.shard_pages)
+
+    def _docling(self, pdf_path, page_range=None):
+        if self.client is not None:
+            return self.client.convert(pdf_path, page_range)
+        if self.converter is None:
+            self.converter = build_converter(self.pipeline_options)
+        return convert_pdf(self.converter, pdf_path, page_range)
+
+    def _convert(self, pdf_path, md_path, plan=None):
+        """
+        Convert in-process, trying the fast path first when configured.
+
+        :return: (tier, metrics) on success, or None on failure.
+        """
+        if not is_complete_pdf(pdf_path):
+            print(f"⚠️ Skipping truncated or invalid PDF: {os.path.basename(pdf_path)}")
+            return None
+
+        started = time.perf_counter()
+        if self.fast_path is not None:
+            try:
+                output_md, metrics = self.fast_path.extract(pdf_path)
+            except Exception as e:
+                output_md, metrics = None, {"reasons": [f"fast_path_error: {type(e).__name__}: {e}"]}
+            if output_md is not None:
+                self.save_markdown(output_md, md_path)
+                metrics["seconds"] = time.perf_counter() - started
+                print(f"Markdown snippet saved -> {os.path.basename(md_path)} (fast path)")
+                return "fast", metrics
+            escalated = metrics["reasons"]
+            print(f"Escalating {os.path.basename(pdf_path)} to docling: {', '.join(escalated)}")
+
+        try:
+            if plan is None:
+                output_md = self._docling(pdf_path)
+            else:
+                output_md = "\n\n".join(self._docling(pdf_path, r) for r in plan)
+            self.save_markdown(output_md, md_path)
+            print(f"Markdown snippet saved -> {os.path.basename(md_path)}")
+            metrics = {"seconds": time.perf_counter() - started}
+            if self.fast_path is not None:
+                metrics["escalated"] = escalated
+            return "docling", metrics
+        except Exception as e:
+            print(f"⚠️ Conversion failed for {os.path.basename(pdf_path)}: {e}")
+            return None
+
+    def _recovery_row(self, arxiv_id, pdf_path, md_path):
+        return [
+            arxiv_id,
+            "",  # title unknown
+            "",  # authors unknown
+            "",  # published unknown
+            "",  # updated unknown
+            "",  # categories unknown
+            "",  # abstract unknown
+            pdf_path,
+            md_path
+        ]
 
+    def _write_metadata(self, topic_dir, rows):
         meta_file = os.path.join(topic_dir, "metadata.csv")
         headers = [
             "arxiv_id", "title", "authors", "published",
             "updated", "categories", "abstract", "pdf_path", "md_path"
         ]
 
-        rows = []
-        for pdf_file in os.listdir(pdf_dir):
-            if pdf_file.endswith(".pdf"):
-                arxiv_id = os.path.splitext(pdf_file)[0]
-                pdf_path = os.path.join(pdf_dir, pdf_file)
-                md_filename = f"{arxiv_id}.md"
-                md_path = os.path.join(md_dir, md_filename)
-
-                if not os.path.exists(md_path):
-                    try:
-                        conversion = self.converter.convert(pdf_path)
-                        output_md = conversion.document.export_to_markdown()
-                        self.save_markdown(output_md, md_path)
-                        print(f"Markdown snippet saved -> {md_filename}")
-                    except Exception as e:
-                        print(f"⚠️ Conversion failed for {pdf_file}: {e}")
-                else:
-                    print(f"Already exists: {md_filename}")
-
-                rows.append([
-                    arxiv_id,
-                    "",  # title unknown
-                    "",  # authors unknown
-                    "",  # published unknown
-                    "",  # updated unknown
-                    "",  # categories unknown
-                    "",  # abstract unknown
-                    pdf_path,
-                    md_path
-                ])
-
         with open(meta_file, mode="w", newline="", encoding="utf-8") as f:
             writer = csv.writer(f)
             writer.writerow(headers)
             writer.writerows(rows)
 
-        print(f"✅ Recovery complete for topic: {topic}. Metadata rebuilt with available PDFs.")
+    def recover_from_pdfs(self, topic):
+        self.recover_all([topic])
+
+    def collect_papers(self, topics):
+        """
+        Group PDFs across topics by arxiv_id.
+
+        :return: {arxiv_id: [(topic, pdf_path, md_path), ...]} with one entry per topic the paper is listed under.
+        """
+        papers = {}
+        for topic in topics:
+            _, pdf_dir, md_dir = self._topic_dirs(topic)
+            if not os.path.isdir(pdf_dir):
+                continue
+            for pdf_file in sorted(os.listdir(pdf_dir)):
+                if pdf_file.endswith(".pdf"):
+                    arxiv_id = os.path.splitext(pdf_file)[0]
+                    papers.setdefault(arxiv_id, []).append((
+                        topic,
+                        os.path.join(pdf_dir, pdf_file),
+                        os.path.join(md_dir, f"{arxiv_id}.md"),
+                    ))
+        return papers
+
+    def fan_out(self, md_source, targets):
+        """Hardlink one converted markdown file into every topic that lists the paper."""
+        for _, _, md_path in targets:
+            if md_path == md_source:
+                continue
+            if not os.path.exists(md_path) or not os.path.samefile(md_source, md_path):
+                link_or_copy(md_source, md_path)
+
+    def _finish_conversion(self, key, md_source, targets, arxiv_id=None, tier=None, metrics=None):
+        """Store a fresh conversion in the cache, note which tier produced it and link it into every topic."""
+        self.cache.put(key, md_source)
+        self.fan_out(md_source, targets)
+        self.cache.record_outputs(key, [md for _, _, md in targets])
+        if tier is not None:
+            self.cache.record_tier(key, arxiv_id, tier, metrics or {})
+            self.tier_counts[tier] += 1
+            self.tier_seconds[tier] += (metrics or {}).get("seconds", 0.0)
+
+    def _pending_conversions(self, papers):
+        """
+        Resolve every paper against the conversion cache and return the rest.
+
+        A paper is skipped when all of its markdown files were produced from the
+        current (PDF sha256, pipeline options, docling version) key, and served
+        from the cache when another run already converted the same bytes.
+        Markdown written before the cache existed is adopted as-is.
+
+        Sharded output (with page markers) differs from a whole-document
+        conversion, so the shard size is part of the key for large PDFs. The
+        page count that decides this is memoized with the PDF hash, so papers
+        that are already up to date are never opened.
+
+        :return: List of (arxiv_id, pdf_path, md_path, targets, key, plan) still
+                 needing conversion; plan is a list of page ranges or None.
+        """
+        pending = []
+        for arxiv_id, targets in papers.items():
+            _, pdf_path, md_path = targets[0]
+            pdf_sha256 = self.cache.pdf_sha256(pdf_path)
+            plan = self._shard_plan(pdf_path)
+            options_hash = self.options_hash if plan is None else f"{self.options_hash}:shards={self.shard_pages}"
+            key = self.cache.make_key(pdf_sha256, options_hash, self.docling_version)
+            md_paths = [md for _, _, md in targets]
+            output_keys = [self.cache.output_key(md) if os.path.exists(md) else "" for md in md_paths]
+
+            if all(k == key for k in output_keys):
+                print(f"Already up to date: {arxiv_id}.md")
+                continue
+
+            if not is_complete_pdf(pdf_path):
+                print(f"⚠️ Skipping truncated or invalid PDF: {os.path.basename(pdf_path)}")
+                continue
+
+            cached = self.cache.get(key)
+            if cached is not None:
+                print(f"Cache hit: {arxiv_id}.md")
+                self.fan_out(cached, targets)
+                self.cache.record_outputs(key, md_paths)
+                continue
+
+            legacy = [md for md, k in zip(md_paths, output_keys) if k is None]
+            if legacy:
+                print(f"Already exists: {arxiv_id}.md")
+                self._finish_conversion(key, legacy[0], targets)
+                continue
+
+            pending.append((arxiv_id, pdf_path, md_path, targets, key, plan))
+        return pending
+
+    def _docling_tasks(self, job):
+        plan = job[5]
+        if plan is None:
+            return [(job, "docling", 0, None)]
+        return [(job, "docling", index, page_range) for index, page_range in enumerate(plan)]
+
+    def _run_pool(self, tasks, num_workers, progress, state):
+        """
+        Run tasks on a fresh process pool. A task is (job, tier, shard_index,
+        page_range). Finishing a task may schedule follow-ups (a rejected
+        fast-path extraction escalates to docling tasks), which go to the same
+        pool, so escalations don't wait for the rest of the batch.
+
+        :return: Tasks lost because a worker process died (e.g., segfault/OOM).
+        """
+        lost = []
+        pool = ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.pipeline_options, self.fast_path),
+            max_tasks_per_child=self.max_docs_per_worker,
+        )
+
+        def submit(task):
+            job, tier, _, page_range = task
+            try:
+                futures[pool.submit(_convert_in_worker, job[1], tier, page_range)] = task
+            except BrokenProcessPool:
+                lost.append(task)
+
+        with pool:
+            futures = {}
+            for task in tasks:
+                submit(task)
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = futures.pop(future)
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool:
+                        lost.append(task)
+                        continue
+                    for follow_up in self._task_done(task, result, progress, state):
+                        submit(follow_up)
+        return lost
+
+    def _task_done(self, task, result, progress, state):
+        """
+        Record one finished task. Shard results are collected in `state` and a
+        document is stitched in page order, written and fanned out as soon as
+        its last shard finishes.
+
+        :return: Follow-up tasks to schedule.
+        """
+        job, tier, shard_index, _ = task
+        arxiv_id, _, md_path, targets, key, plan = job
+        output_md, error, metrics = result
+        doc = state.setdefault(arxiv_id, {"parts": {}, "error": None, "seconds": 0.0})
+        if doc["error"] is not None:
+            return []  # already reported as failed
+        doc["seconds"] += metrics.get("seconds", 0.0)
+
+        if tier == "fast":
+            # A fast-path crash is just another reason to escalate, like a rejection
+            if error is not None:
+                doc["escalated"] = [f"fast_path_error: {error}"]
+                return self._docling_tasks(job)
+            if output_md is None:
+                doc["escalated"] = metrics["reasons"]
+                return self._docling_tasks(job)
+            doc["parts"][0] = output_md
+        elif error is None:
+            doc["parts"][shard_index] = output_md
+            if len(doc["parts"]) < len(plan or [None]):
+                return []
+        else:
+            doc["error"] = error
+
+        progress["done"] += 1
+        step = f"[{progress['done']}/{progress['total']}]"
+        if doc["error"] is None:
+            self.save_markdown("\n\n".join(doc["parts"][i] for i in sorted(doc["parts"])), md_path)
+            metrics = dict(metrics, seconds=doc["seconds"])
+            if "escalated" in doc:
+                metrics["escalated"] = doc["escalated"]
+            self._finish_conversion(key, md_path, targets, arxiv_id, tier, metrics)
+            note = " (fast path)" if tier == "fast" else (f" ({len(plan)} shards)" if plan else "")
+            print(f"{step} Markdown saved -> {os.path.basename(md_path)}{note}")
+        else:
+            print(f"{step} ⚠️ Conversion failed for {arxiv_id}: {doc['error']}")
+        return []
+
+    def _convert_parallel(self, pending):
+        """
+        Convert PDFs from all topics on a process pool. Each worker builds its
+        DocumentConverter once and is replaced after `max_docs_per_worker`
+        tasks. With a fast path configured, every document starts as a cheap
+        text-layer task and only rejected ones are escalated to docling.
+        Large PDFs are split into page-range shards so one long survey does
+        not hold up a single worker. A crashing worker takes its whole pool
+        down, so tasks lost that way are retried one per process; only the
+        real culprit fails.
+        """
+        tasks = []
+        for job in pending:
+            if self.fast_path is not None:
+                tasks.append((job, "fast", 0, None))
+            else:
+                tasks.extend(self._docling_tasks(job))
+
+        # Longest documents first so their shards start early and don't form the tail
+        tasks.sort(key=lambda task: -len(task[0][5] or [None]))
+
+        progress = {"done": 0, "total": len(pending)}
+        state = {}
+        lost = self._run_pool(tasks, self.num_workers, progress, state)
+
+        for task in lost:
+            if self._run_pool([task], 1, progress, state):
+                self._task_done(task, (None, "worker crashed", {}), progress, state)
+
+    def _convert_remote(self, pending):
+        """Keep num_workers requests in flight against the conversion daemon."""
+        with ThreadPoolExecutor(max_workers=self.num_workers) as pool:
+            futures = {
+                pool.submit(self._convert, pdf_path, md_path, plan): (arxiv_id, md_path, targets, key)
+                for arxiv_id, pdf_path, md_path, targets, key, plan in pending
+            }
+            for future in as_completed(futures):
+                arxiv_id, md_path, targets, key = futures[future]
+                converted = future.result()
+                if converted is not None:
+                    tier, metrics = converted
+                    self._finish_conversion(key, md_path, targets, arxiv_id, tier, metrics)
+
+    def recover_all(self, topics):
+        """
+        Convert every paper exactly once, however many topics it is cross-listed
+        under, then link the markdown into each of those topics. With
+        num_workers > 1 the conversions run on a process pool across all topics,
+        or are sent that many at a time to the conversion daemon if one is set.
+        """
+        papers = self.collect_papers(topics)
+        pending = self._pending_conversions(papers)
+
+        if self.client is not None:
+            self._convert_remote(pending)
+        elif self.num_workers > 1:
+            self._convert_parallel(pending)
+        else:
+            for arxiv_id, pdf_path, md_path, targets, key, plan in pending:
+                converted = self._convert(pdf_path, md_path, plan)
+                if converted is not None:
+                    tier, metrics = converted
+                    self._finish_conversion(key, md_path, targets, arxiv_id, tier, metrics)
+
+        rows_by_topic = {topic: [] for topic in topics}
+        for arxiv_id, targets in papers.items():
+            for topic, pdf_path, md_path in targets:
+                rows_by_topic[topic].append(self._recovery_row(arxiv_id, pdf_path, md_path))
+
+        for topic, rows in rows_by_topic.items():
+            topic_dir, _, _ = self._topic_dirs(topic)
+            self._write_metadata(topic_dir, rows)
+
+        print(
+            f"✅ Recovery complete for {len(papers)} unique papers across {len(topics)} topics "
+            f"(cache hits: {self.cache.hits}, misses: {self.cache.misses})."
+        )
+        for tier, count in sorted(self.tier_counts.items()):
+            print(f"   {tier}: {count} documents, {self.tier_seconds[tier] / count:.2f}s avg")
 
 
 if __name__ == "__main__":
@@ -182,7 +623,11 @@ if __name__ == "__main__":
         "q-bio.BM", "q-bio.NC", "q-fin.PR", "econ.EM", "physics.soc-ph"
     ]
 
-    # Example usage of recovery class
-    recovery = ArxivRecoveryGenerator(save_dir="arxiv_data")
-    for topic in topics:
-        recovery.recover_from_pdfs(topic)
\ No newline at end of file
+    # Example usage of recovery class; cross-listed papers are converted once
+    recovery = ArxivRecoveryGenerator(
+        save_dir="arxiv_data",
+        num_workers=max(1, (os.cpu_count() or 2) // 2),
+        fast_path=FastPathExtractor(),
+        # converter_url="http://127.0.0.1:8090",  # reuse warm models from `python convd.py`
+    )
+    recovery.recover_all(topics)
\ No newline at end of file
@@ -1,52 +1,222 @@
 import os
-import csv
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from chonkie import RecursiveChunker  # Swap in desired chunker: SentenceChunker, SemanticChunker, etc.
+from chunkmanifest import ChunkManifest, chunker_fingerprint
+from chunkstore import ChunkStore
+from corpus import MarkdownCorpus, chunk_spans
+
+# Per-process chunker for the parallel mode; set once by _init_worker
+_worker_chunker = None
+_worker_offsets = False
+
+
+def _init_worker(chunker, offsets=False):
+    global _worker_chunker, _worker_offsets
+    _worker_chunker = chunker
+    _worker_offsets = offsets
+
+
+def chunk_markdown(chunker, md_path, offsets=False):
+    """
+    :return: [(chunk_text, token_count), ...] for one markdown file, or with
+             offsets=True [(start, end, token_count), ...] byte spans within it.
+    """
+    with open(md_path, "r", encoding="utf-8") as f:
+        text = f.read()
+    chunks = chunker(text)
+    if offsets:
+        return chunk_spans(text, chunks)
+    return [(chunk.text, getattr(chunk, "token_count", None)) for chunk in chunks]
+
+
+def _chunk_in_worker(md_path):
+    return chunk_markdown(_worker_chunker, md_path, _worker_offsets)
+
+
+def collect_markdown(save_dir):
+    """
+    Group markdown files by paper across topics.
+
+    :return: {pdf_name: [(topic, md_path), ...]} sorted by pdf_name and topic.
+    """
+    papers = {}
+    for topic_dir in sorted(os.listdir(save_dir)):
+        md_dir = os.path.join(save_dir, topic_dir, "markdown")
+        if not os.path.isdir(md_dir):
+            continue
+
+        topic = topic_dir.replace("_", ".")
+
+        for md_filename in sorted(os.listdir(md_dir)):
+            if not md_filename.endswith(".md"):
+                continue
+            pdf_name = md_filename[:-3]
+            papers.setdefault(pdf_name, []).append((topic, os.path.join(md_dir, md_filename)))
+
+    return dict(sorted(papers.items()))
+
+
+def _take(cursor, pdf_name):
+    """
+    Advance a [papers iterator, current paper] merge cursor over an old
+    partition to pdf_name. Both sides are sorted by pdf_name, so each old
+    partition is read once, front to back.
+
+    :return: The paper's old chunks, or None if the partition doesn't have it.
+    """
+    while cursor[1] is not None and cursor[1][0] < pdf_name:
+        cursor[1] = next(cursor[0], None)
+    if cursor[1] is not None and cursor[1][0] == pdf_name:
+        return cursor[1][1]
+    return None
+
 
 class ArxivUnifiedChunker:
-    def __init__(self, save_dir="arxiv_data", chunker=None):
+    def __init__(self, save_dir="arxiv_data", chunker=None, num_workers=1, row_group_size=4096, offsets=False):
         """
         :param save_dir: Root directory containing topic subfolders with markdown files.
         :param chunker: Chonkie chunker instance; defaults to RecursiveChunker.
+                        With num_workers > 1 each worker process gets its own copy.
+        :param num_workers: Chunking processes; 1 chunks in-process.
+        :param row_group_size: Rows per Parquet row group in the chunk store.
+        :param offsets: Store (doc_id, start, end) byte ranges into a memory-mapped
+                        corpus file (arxiv_data/corpus) instead of chunk text.
         """
         self.save_dir = save_dir
         self.chunker = chunker or RecursiveChunker()
-        self.output_file = os.path.join(self.save_dir, "all_chunks.csv")
-
-    def run(self):
-        fieldnames = ["topic", "pdf_name", "chunk_id", "chunk_text", "token_count"]
-        with open(self.output_file, "w", newline="", encoding="utf-8") as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-
-            for topic_dir in os.listdir(self.save_dir):
-                topic_folder = os.path.join(self.save_dir, topic_dir)
-                md_dir = os.path.join(topic_folder, "markdown")
-                if not os.path.isdir(md_dir):
-                    continue
-
-                topic = topic_dir.replace("_", ".")
-
-                for md_filename in os.listdir(md_dir):
-                    if not md_filename.endswith(".md"):
-                        continue
-
-                    pdf_name = md_filename[:-3]
-                    md_path = os.path.join(md_dir, md_filename)
-                    with open(md_path, "r", encoding="utf-8") as f:
-                        text = f.read()
-
-                    chunks = self.chunker(text)
-                    for idx, chunk in enumerate(chunks, start=1):
-                        writer.writerow({
-                            "topic": topic,
-                            "pdf_name": pdf_name,
-                            "chunk_id": f"{pdf_name}_chunk_{idx}",
-                            "chunk_text": chunk.text,
-                            "token_count": getattr(chunk, "token_count", None),
-                        })
-
-        print(f"All chunks saved to {self.output_file}")
+        self.num_workers = num_workers
+        self.row_group_size = row_group_size
+        self.output_dir = os.path.join(self.save_dir, "all_chunks")
+        self.store = ChunkStore(self.output_dir)
+        self.offsets = offsets
+        self.corpus = MarkdownCorpus(os.path.join(self.save_dir, "corpus")) if offsets else None
+        self.manifest = ChunkManifest(os.path.join(self.save_dir, "cache", "chunks.sqlite"))
+
+    def collect_documents(self):
+        return collect_markdown(self.save_dir)
+
+    def _chunked_documents(self, documents):
+        """
+        Yield (pdf_name, listings, chunks) in the order of `documents`.
+
+        The parallel mode keeps only a bounded window of documents in flight
+        and yields them strictly in input order, so the output matches the
+        serial run row for row and memory doesn't grow with the corpus.
+        """
+        if self.num_workers <= 1:
+            for pdf_name, listings in documents:
+                yield pdf_name, listings, chunk_markdown(self.chunker, listings[0][1], self.offsets)
+            return
+
+        with ProcessPoolExecutor(
+            max_workers=self.num_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.chunker, self.offsets),
+        ) as pool:
+            window = deque()
+            for pdf_name, listings in documents:
+                window.append((pdf_name, listings, pool.submit(_chunk_in_worker, listings[0][1])))
+                if len(window) >= self.num_workers * 4:
+                    pdf_name, listings, future = window.popleft()
+                    yield pdf_name, listings, future.result()
+            while window:
+                pdf_name, listings, future = window.popleft()
+                yield pdf_name, listings, future.result()
+
+    def _store_values(self, pdf_name, md_path, chunks):
+        """In offset mode, add the document to the corpus and make its chunk spans absolute."""
+        if not self.offsets:
+            return chunks
+        with open(md_path, "r", encoding="utf-8") as f:
+            doc_id, base = self.corpus.add(pdf_name, f.read())
+        return [(doc_id, base + start, base + end, token_count) for start, end, token_count in chunks]
+
+    def run(self, incremental=False):
+        """
+        Chunk all markdown into the topic-partitioned Parquet chunk store.
+
+        :param incremental: Only re-chunk papers whose markdown or chunker
+                            (class, params, chonkie version) changed since the
+                            last run. Only partitions of topics that gained,
+                            lost or changed papers are rewritten, carrying over
+                            the chunks of their unchanged papers; the others
+                            are left untouched. The result is identical to a
+                            full run.
+        """
+        documents = self.collect_documents()
+        fingerprint = chunker_fingerprint(self.chunker) + (":offsets" if self.offsets else "")
+        hashes = {pdf_name: self.manifest.md_sha256(listings[0][1]) for pdf_name, listings in documents.items()}
+        topics = {topic for listings in documents.values() for topic, _ in listings}
+        stored_topics = set(self.store.topics())
+
+        previous = self.manifest.documents() if incremental else {}
+        reuse, dirty = set(), set() if incremental else set(topics)
+        for pdf_name, listings in documents.items():
+            listed = {topic for topic, _ in listings}
+            old = previous.get(pdf_name)
+            if old is not None and old[:2] == (hashes[pdf_name], fingerprint) and listed <= set(old[2]) & stored_topics:
+                reuse.add(pdf_name)
+                dirty |= set(old[2]) ^ listed
+            else:
+                dirty |= listed | set(old[2] if old else [])
+        for pdf_name in set(previous) - set(documents):
+            dirty |= set(previous[pdf_name][2])
+        dirty |= topics - stored_topics
+
+        to_chunk = [(pdf_name, listings) for pdf_name, listings in documents.items() if pdf_name not in reuse]
+        if incremental:
+            removed = len(set(previous) - set(documents))
+            print(
+                f"🔍 Re-chunking {len(to_chunk)} new or changed papers, keeping {len(reuse)}, dropping {removed}; "
+                f"rewriting {len(dirty & topics)} of {len(topics)} topic partitions."
+            )
+
+        rewrite = sorted(dirty & topics)
+        # Only an incremental run carries chunks over, so only it needs to read the old partitions
+        cursors = {}
+        for topic in rewrite:
+            if incremental and topic in stored_topics:
+                papers = self.store.papers(topic)
+                cursors[topic] = [papers, next(papers, None)]
+        self.store.link_corpus(self.corpus.root if self.offsets else None)
+        writers = {topic: self.store.writer(topic, self.row_group_size) for topic in rewrite}
+        fresh = self._chunked_documents(to_chunk)
+        manifest_rows = []
+
+        # Cross-listed papers are chunked once and their rows fanned out to each topic
+        for pdf_name, listings in documents.items():
+            if pdf_name in reuse:
+                chunks = None
+                for topic, _ in listings:
+                    if topic in writers:
+                        chunks = _take(cursors[topic], pdf_name)
+                        if chunks is None:
+                            md_path = listings[0][1]
+                            chunks = self._store_values(pdf_name, md_path, chunk_markdown(self.chunker, md_path, self.offsets))
+                        writers[topic].write(pdf_name, chunks)
+                num_chunks = previous[pdf_name][3] if chunks is None else len(chunks)
+            else:
+                _, _, chunks = next(fresh)
+                chunks = self._store_values(pdf_name, listings[0][1], chunks)
+                for topic, _ in listings:
+                    writers[topic].write(pdf_name, chunks)
+                num_chunks = len(chunks)
+            manifest_rows.append((pdf_name, hashes[pdf_name], fingerprint, num_chunks, [topic for topic, _ in listings]))
+
+        for cursor in cursors.values():
+            cursor[0].close()
+        for writer in writers.values():
+            writer.commit()
+        for topic in stored_topics - topics:
+            self.store.remove(topic)
+        self.manifest.replace_all(manifest_rows)
+
+        total = sum(writer.rows for writer in writers.values())
+        print(f"All chunks saved to {self.output_dir} ({total} rows written across {len(writers)} topics)")
 
 if __name__ == "__main__":
-    chunker = ArxivUnifiedChunker(save_dir="arxiv_data")
-    chunker.run()
+    chunker = ArxivUnifiedChunker(save_dir="arxiv_data", num_workers=max(1, (os.cpu_count() or 2) // 2))
+    chunker.run(incremental=True)
@@ -1,55 +1,377 @@
 import os
-import csv
+import asyncio
+from collections import Counter, deque
+from concurrent.futures import Future
+import numpy as np
 import pandas as pd
 import pyarrow as pa
 import pyarrow.parquet as pq
 import nbs.lms as lms
+from chunkstore import ChunkStore
+from embcache import EmbeddingCache
+from embclient import AsyncEmbeddingClient
+from embmatrix import EmbeddingMatrixWriter
+from embparts import EmbeddingCheckpoint, embedding_schema
+from dedup import load_canonical
+from batching import estimate_tokens, pack_by_tokens, unpack, padded_tokens
+
 
 class ArxivEmbeddingStreamer:
-    def __init__(self, save_dir="arxiv_data", chunk_csv="all_chunks.csv", model_key="text-embedding-qwen3-embedding-4b"):
+    def __init__(
+        self,
+        save_dir="arxiv_data",
+        chunk_store="all_chunks",
+        model_key="text-embedding-qwen3-embedding-4b",
+        topics=None,
+        batch_size=64,
+        row_group_size=8192,
+        cache=True,
+        api_url=None,
+        max_concurrency=4,
+        max_batch_tokens=None,
+        sort_window=4096,
+        matrix_dtype="float32",
+        dedup=True,
+    ):
+        """
+        :param chunk_store: Directory of the Parquet chunk store written by stage 03.
+        :param topics: Only embed these topics (e.g., ["stat.ML"]); None embeds all.
+        :param batch_size: Chunk texts sent to the embedding model per request (the
+                           upper bound per request with max_batch_tokens).
+        :param row_group_size: Rows buffered per Parquet row group in the output.
+        :param cache: EmbeddingCache to consult before calling the model; True uses
+                      arxiv_data/cache/embeddings.sqlite, False disables caching.
+        :param api_url: OpenAI-compatible embeddings endpoint (e.g., http://localhost:1234/v1/embeddings).
+                        When set, batches go through AsyncEmbeddingClient and reading,
+                        requests and Parquet writes overlap instead of using the lmstudio SDK.
+        :param max_concurrency: Batch requests in flight at once with api_url.
+        :param max_batch_tokens: Pack requests by token_count up to this padded token budget
+                                 instead of fixed-count batches (e.g., the server's batch context).
+        :param sort_window: Rows read and sorted by length together with max_batch_tokens;
+                            output keeps the store's row order.
+        :param matrix_dtype: Also write the embeddings as a memory-mappable matrix in
+                             arxiv_data/embeddings ("float32", "float16" or "int8" with
+                             per-row scales; see embmatrix.EmbeddingMatrix); None skips it.
+        :param dedup: Embed only the canonical chunk of each duplicate group found by
+                      dedup.py (if its map is current) and fan the vector out to the copies.
+        """
         self.save_dir = save_dir
-        self.chunk_csv = os.path.join(save_dir, chunk_csv)
+        self.store = ChunkStore(os.path.join(save_dir, chunk_store))
+        self.topics = topics
+        self.batch_size = batch_size
+        self.row_group_size = row_group_size
         self.output_parquet = os.path.join(save_dir, "all_chunks_with_embeddings.parquet")
-        self.model = lms.embedding_model(model_key)
+        self.matrix_dir = os.path.join(save_dir, "embeddings")
+        self.parts_dir = os.path.join(save_dir, "embedding_parts")
+        self.dedup = dedup
+        self.canonical = None
+        self.reused = 0
+        self.matrix_dtype = matrix_dtype
+        self.model_key = model_key
+        self.api_url = api_url
+        self.max_concurrency = max_concurrency
+        self.model = lms.embedding_model(model_key) if api_url is None else None
+        self.max_batch_tokens = max_batch_tokens
+        self.sort_window = sort_window
+        # Requests, real tokens and padded tokens sent with max_batch_tokens
+        self.packed = [0, 0, 0]
+        if cache is True:
+            cache = EmbeddingCache(os.path.join(save_dir, "cache", "embeddings.sqlite"))
+        self.cache = cache or None
+
+    def shared_uses(self, done=frozenset()):
+        """
+        How often each shared embedding will be used by the rows still to embed:
+        {canonical_id: rows} with a dedup map, otherwise {pdf_name: topics} for
+        papers stored under more than one topic. Rows whose (topic, chunk_id) is
+        in `done` are not counted, so a resumed run uses up (and frees) every entry.
+        """
+        counts, pairs = Counter(), set()
+        for batch in self.store.iter_batches(columns=["topic", "pdf_name", "chunk_id"], topics=self.topics):
+            columns = (batch.column(name).to_pylist() for name in ("topic", "pdf_name", "chunk_id"))
+            for topic, pdf_name, chunk_id in zip(*columns):
+                if (topic, chunk_id) in done:
+                    continue
+                if self.canonical is not None:
+                    counts[self.canonical.get((topic, chunk_id), chunk_id)] += 1
+                else:
+                    pairs.add((pdf_name, topic))
+        if self.canonical is None:
+            counts = Counter(pdf_name for pdf_name, _ in pairs)
+        return {key: count for key, count in counts.items() if count > 1}
+
+    def _pack(self, texts, token_counts):
+        """Requests (index lists) for texts, packed by token count; the whole list is one request without a budget."""
+        if self.max_batch_tokens is None:
+            return [list(range(len(texts)))]
+        counts = [token_counts.get(text) or estimate_tokens(text) for text in texts]
+        requests = pack_by_tokens(counts, self.max_batch_tokens, max_items=self.batch_size)
+        self.packed[0] += len(requests)
+        self.packed[1] += sum(counts)
+        self.packed[2] += padded_tokens(requests, counts)
+        return requests
+
+    def embed_batch(self, texts, token_counts=None):
+        """
+        Embed a list of texts, cached ones from the cache and the rest in as few
+        requests as fit the token budget; returns a float32 array of shape (len(texts), dim).
+
+        :param token_counts: {text: token_count} used to pack requests.
+        """
+
+        def embed(texts):
+            requests = self._pack(texts, token_counts or {})
+            return unpack(requests, [self.model.embed([texts[i] for i in indices]) for indices in requests], len(texts))
+
+        if self.cache is not None:
+            return self.cache.embed(self.model_key, texts, embed)
+        return embed(texts)
+
+    def _plan_rows(self, rows, shared, shared_embeddings):
+        """
+        One Future per row of a batch, plus {key: (chunk_text, token_count, Future)}
+        for the texts that still need embedding. A chunk repeated within the batch is
+        sent once; a cross-listed chunk is embedded once and its Future kept until
+        every topic it appears under has used it, then dropped.
+
+        With a dedup map the key is the chunk's canonical_id and `shared` counts the
+        rows per canonical_id, so every duplicate reuses the canonical's vector.
+        """
+        slots = []
+        to_embed = {}
+        for row in rows:
+            if self.canonical is not None:
+                key = self.canonical.get((row["topic"], row["chunk_id"]), row["chunk_id"])
+                uses = shared.get(key, 1)
+            else:
+                key = row["chunk_id"]
+                uses = shared.get(row["pdf_name"], 1)
+
+            if key in shared_embeddings:
+                entry = shared_embeddings[key]
+                slots.append(entry[0])
+                self.reused += 1
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del shared_embeddings[key]
+            elif key in to_embed:
+                slots.append(to_embed[key][2])
+                self.reused += 1
+            else:
+                future = Future()
+                to_embed[key] = (row["chunk_text"], row["token_count"], future)
+                slots.append(future)
+                if uses > 1:
+                    shared_embeddings[key] = [future, uses - 1]
+        return slots, to_embed
+
+    @staticmethod
+    def _fill(to_embed, embedded):
+        for (_, _, future), vector in zip(to_embed.values(), embedded):
+            future.set_result(vector)
+
+    def _embed_rows(self, rows, shared, shared_embeddings):
+        """Embeddings for one batch of rows (see _plan_rows)."""
+        slots, to_embed = self._plan_rows(rows, shared, shared_embeddings)
+        if to_embed:
+            texts = [text for text, _, _ in to_embed.values()]
+            token_counts = {text: token_count for text, token_count, _ in to_embed.values()}
+            self._fill(to_embed, self.embed_batch(texts, token_counts))
+        return [slot.result() for slot in slots]
+
+    async def _embedded_batches_async(self, client, batches, shared, shared_embeddings):
+        """
+        Yield (rows, vectors) in input order while up to 2 * max_concurrency
+        batches are in flight. Batches are read in a thread so the event loop
+        keeps the requests moving.
+        """
+
+        async def embed(texts, token_counts):
+            async def send(texts):
+                # Packed requests run concurrently (bounded by the client) and are put back in order
+                requests = self._pack(texts, token_counts)
+                results = await asyncio.gather(*(client.embed([texts[i] for i in indices]) for indices in requests))
+                return unpack(requests, results, len(texts))
+
+            if self.cache is not None:
+                return await self.cache.aembed(self.model_key, texts, send)
+            return await send(texts)
+
+        window = deque()
+        batches = iter(batches)
+        while True:
+            batch = await asyncio.to_thread(next, batches, None)
+            if batch is not None:
+                rows = batch.to_pylist()
+                slots, to_embed = self._plan_rows(rows, shared, shared_embeddings)
+                texts = [text for text, _, _ in to_embed.values()]
+                token_counts = {text: token_count for text, token_count, _ in to_embed.values()}
+                task = asyncio.create_task(embed(texts, token_counts)) if texts else None
+                window.append((rows, slots, to_embed, task))
+            # Earlier batches finish first, so memo Futures from them are always resolved here
+            while window and (batch is None or len(window) >= self.max_concurrency * 2):
+                rows, slots, to_embed, task = window.popleft()
+                if task is not None:
+                    self._fill(to_embed, await task)
+                yield rows, [slot.result() for slot in slots]
+            if batch is None:
+                return
+
+    @staticmethod
+    def _pending_batches(batches, done):
+        """Drop rows whose (topic, chunk_id) already has a committed embedding."""
+        for batch in batches:
+            if done:
+                keys = zip(batch.column("topic").to_pylist(), batch.column("chunk_id").to_pylist())
+                batch = batch.filter(pa.array([key not in done for key in keys]))
+            if batch.num_rows:
+                yield batch
 
-    def run(self):
-        if not os.path.exists(self.chunk_csv):
-            print(f"Error: {self.chunk_csv} not found.")
+    def run(self, resume=True, finalize=True):
+        """
+        Embed every chunk, committing each full row group as a part-file in
+        arxiv_data/embedding_parts, then finalize.
+
+        :param resume: Skip chunks already in committed parts of an interrupted run;
+                       False starts over.
+        :param finalize: Compact the parts into the output Parquet (and matrix) at the end.
+        """
+        if not self.store.topics():
+            print(f"Error: {self.store.root} not found.")
+            return
+
+        checkpoint = EmbeddingCheckpoint(self.parts_dir, self.model_key)
+        if not resume:
+            checkpoint.clear()
+        done = checkpoint.done_keys()
+        if done:
+            print(f"🔍 Resuming: {len(done)} chunks already embedded in {len(checkpoint.parts())} parts.")
+
+        if self.dedup:
+            self.canonical = load_canonical(self.save_dir, os.path.basename(self.store.root))
+        shared = self.shared_uses(done)
+        shared_embeddings = {}
+        columns = ["topic", "pdf_name", "chunk_id", "chunk_text", "token_count"]
+        # With a token budget, rows are read in larger windows so requests can be packed by length
+        read_size = self.batch_size if self.max_batch_tokens is None else self.sort_window
+        batches = self._pending_batches(
+            self.store.iter_batches(columns=columns, topics=self.topics, batch_size=read_size), done
+        )
+        sink = _EmbeddingSink(checkpoint, columns, self.row_group_size)
+
+        if self.api_url is None:
+            for batch in batches:
+                rows = batch.to_pylist()
+                sink.write(rows, self._embed_rows(rows, shared, shared_embeddings))
+        else:
+            async def pipeline():
+                async with AsyncEmbeddingClient(
+                    self.api_url, self.model_key, max_concurrency=self.max_concurrency
+                ) as client:
+                    async for rows, vectors in self._embedded_batches_async(client, batches, shared, shared_embeddings):
+                        # Writes run in a thread while the next requests are in flight
+                        await asyncio.to_thread(sink.write, rows, vectors)
+                    print(f"Embedding requests: {client.requests} ({client.retried} retried)")
+
+            asyncio.run(pipeline())
+        sink.close()
+        print(f"✅ Embedded {sink.rows} chunks ({checkpoint.rows()} committed in {len(checkpoint.parts())} parts).")
+
+        if self.reused:
+            print(f"Reused {self.reused} embeddings for duplicate or cross-listed chunks.")
+        requests, tokens, padded = self.packed
+        if requests:
+            print(f"Packed {requests} requests, {tokens / requests:.0f} tokens per request, {tokens / padded:.0%} padding efficiency")
+        if self.cache is not None:
+            stats = self.cache.stats()
+            print(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate)")
+
+        if finalize:
+            self.finalize(checkpoint)
+        else:
+            checkpoint.close()
+
+    def finalize(self, checkpoint=None):
+        """
+        Compact the committed parts into the output Parquet file and write the
+        embedding matrix from it in the same pass; the parts are deleted afterwards.
+        """
+        checkpoint = checkpoint or EmbeddingCheckpoint(self.parts_dir)
+        if not checkpoint.parts():
+            print(f"⚠️ No committed parts in {self.parts_dir}; nothing to finalize.")
+            checkpoint.remove()
             return
+        matrix = EmbeddingMatrixWriter(self.matrix_dir, self.matrix_dtype, self.model_key) if self.matrix_dtype else None
+
+        def add_to_matrix(batch):
+            embeddings = batch.column("embedding")
+            matrix.write(
+                embeddings.flatten().to_numpy().reshape(len(embeddings), embeddings.type.list_size),
+                *(batch.column(name).to_pylist() for name in ("topic", "pdf_name", "chunk_id")),
+            )
+
+        rows = checkpoint.finalize(self.output_parquet, self.row_group_size, add_to_matrix if matrix else None)
+        if matrix is not None:
+            matrix.close()
+        checkpoint.remove()
+
+        print(f"Streaming embeddings saved to {self.output_parquet} ({rows} rows)")
+        if matrix is not None:
+            print(f"Embedding matrix ({self.matrix_dtype}, {matrix.rows} rows) saved to {self.matrix_dir}")
 
-        # Initialize variables for streaming
-        writer = None
-        schema = None
 
-        with open(self.chunk_csv, newline="", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            
-            for row_idx, row in enumerate(reader, start=1):
-                chunk_text = row["chunk_text"]
-                embedding = self.model.embed(chunk_text)
+class _EmbeddingSink:
+    """
+    Buffer embedded rows and commit every `row_group_size` rows as a part-file
+    of the EmbeddingCheckpoint.
+    """
 
-                # Add embedding as a list to row
-                row["embedding"] = embedding
+    def __init__(self, checkpoint, columns, row_group_size):
+        self.checkpoint = checkpoint
+        self.columns = columns
+        self.row_group_size = row_group_size
+        self.schema = None
+        self.buffer = {name: [] for name in columns + ["embedding"]}
+        self.rows = 0
 
-                # Create a PyArrow Table from this row if it's the first
-                table = pa.Table.from_pydict({k: [v] for k, v in row.items()})
-                
-                if writer is None:
-                    schema = table.schema
-                    writer = pq.ParquetWriter(self.output_parquet, schema=schema, compression='SNAPPY')
-                
-                writer.write_table(table)
+    def flush(self, count):
+        """Commit the first `count` buffered rows as one part-file."""
+        vectors = np.stack(self.buffer["embedding"][:count])
+        table = pa.Table.from_pydict(
+            {
+                **{name: self.buffer[name][:count] for name in self.columns},
+                "embedding": pa.FixedSizeListArray.from_arrays(
+                    pa.array(vectors.ravel(), type=pa.float32()),
+                    self.schema.field("embedding").type.list_size,
+                ),
+            },
+            schema=self.schema,
+        )
+        self.checkpoint.commit(table)
+        for values in self.buffer.values():
+            del values[:count]
 
-                if row_idx % 100 == 0:
-                    print(f"Processed {row_idx} chunks...")
+    def write(self, rows, vectors):
+        if self.schema is None:
+            self.schema = embedding_schema(len(vectors[0]))
 
-        if writer:
-            writer.close()
-        
-        print(f"Streaming embeddings saved to {self.output_parquet}")
+        for row, vector in zip(rows, vectors):
+            for name in self.columns:
+                self.buffer[name].append(row[name])
+            self.buffer["embedding"].append(vector)
+
+        while len(self.buffer["chunk_id"]) >= self.row_group_size:
+            self.flush(self.row_group_size)
+
+        previous, self.rows = self.rows, self.rows + len(rows)
+        if self.rows // 1000 > previous // 1000:
+            print(f"Processed {self.rows} chunks...")
+
+    def close(self):
+        if self.buffer["chunk_id"]:
+            self.flush(len(self.buffer["chunk_id"]))
 
 
 if __name__ == "__main__":
     streamer = ArxivEmbeddingStreamer(save_dir="arxiv_data")
     streamer.run()
-
@@ -0,0 +1,293 @@
+import os
+import json
+import time
+import numpy as np
+import pyarrow.dataset as ds
+from embmatrix import EmbeddingMatrix, EmbeddingMatrixWriter
+
+
+def kmeans(x, k, iterations=20, seed=0, block_size=65536):
+    """
+    Lloyd's k-means on float32 rows; assignments are computed block by block
+    as argmax(x . c - |c|^2 / 2). Empty clusters are re-seeded from random rows.
+
+    :return: (k, dim) float32 centroids.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), k, replace=len(x) < k)].astype(np.float32)
+    for _ in range(iterations):
+        labels = assign(x, centroids, block_size)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centroids)
+        # Per-cluster sums block by block, so only one block is ever copied
+        for start in range(0, len(x), block_size):
+            block_labels = labels[start:start + block_size]
+            order = np.argsort(block_labels, kind="stable")
+            present, starts = np.unique(block_labels[order], return_index=True)
+            sums[present] += np.add.reduceat(x[start:start + block_size][order], starts, axis=0)
+        nonempty = counts > 0
+        centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+        empty = np.flatnonzero(~nonempty)
+        if len(empty):
+            centroids[empty] = x[rng.choice(len(x), len(empty))]
+    return centroids
+
+
+def assign(x, centroids, block_size=65536):
+    """Index of the nearest (L2) centroid for every row of x."""
+    half_norms = (centroids ** 2).sum(axis=1) / 2
+    labels = np.empty(len(x), dtype=np.int64)
+    for start in range(0, len(x), block_size):
+        labels[start:start + block_size] = np.argmax(x[start:start + block_size] @ centroids.T - half_norms, axis=1)
+    return labels
+
+
+class IVFPQIndex:
+    """
+    In-process IVF-PQ approximate nearest neighbour index over NumPy arrays.
+
+    Vectors are clustered into `nlist` inverted lists (k-means centroids);
+    each vector's residual to its centroid is product-quantized into `m`
+    one-byte codes. A query scans the codes of its `nprobe` closest lists
+    with per-subspace lookup tables and can re-rank the best `rerank`
+    candidates exactly against the float16 copy of the vectors.
+
+    Everything lives under one directory and is opened with memory maps:
+    codes.npy / ids.npy (inverted lists, contiguous per list), offsets.npy,
+    centroids.npy, codebooks.npy, vectors/ (an EmbeddingMatrix, float16),
+    docs.bin + doc_offsets.npy (text and metadata per row), meta.json.
+    Scores are inner products; with metric="cosine" vectors and queries are
+    normalized first.
+    """
+
+    def __init__(self, root: str):
+        """
+        :param root: Index directory written by IVFPQIndex.build (e.g., arxiv_data/ann).
+        """
+        self.root = root
+        with open(os.path.join(root, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.m = self.meta["m"]
+        self.metric = self.meta["metric"]
+        self.centroids = np.load(os.path.join(root, "centroids.npy"))
+        self.codebooks = np.load(os.path.join(root, "codebooks.npy"))
+        self.offsets = np.load(os.path.join(root, "offsets.npy"))
+        self.codes = np.load(os.path.join(root, "codes.npy"), mmap_mode="r")
+        self.ids = np.load(os.path.join(root, "ids.npy"), mmap_mode="r")
+        self.vectors = EmbeddingMatrix(os.path.join(root, "vectors"))
+        self.doc_offsets = np.load(os.path.join(root, "doc_offsets.npy"), mmap_mode="r")
+        self.docs = np.memmap(os.path.join(root, "docs.bin"), dtype=np.uint8, mode="r") if self.doc_offsets[-1] else None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(
+        cls, root, embeddings_parquet="arxiv_data/all_chunks_with_embeddings.parquet", nlist=None, m=32,
+        metric="cosine", train_size=65536, iterations=20, batch_size=16384, seed=0,
+    ):
+        """
+        Build an index from stage 04's Parquet output in two passes: the Parquet
+        file is streamed once into the float16 vector matrix and the document
+        blob, then the matrix is streamed to train (on a sample) and encode.
+
+        :param nlist: Inverted lists; default 4 * sqrt(rows), at most one per 39 training rows.
+        :param m: PQ subspaces (bytes per vector); must divide the embedding dimension.
+        :param metric: "cosine" (normalize vectors) or "ip" (raw inner product).
+        :param train_size: Rows sampled to train centroids and codebooks.
+        :return: The opened IVFPQIndex.
+        """
+        if metric not in ("cosine", "ip"):
+            raise ValueError(f"Unsupported metric: {metric}")
+        started = time.perf_counter()
+        os.makedirs(root, exist_ok=True)
+        cls._write_vectors(root, embeddings_parquet, metric, batch_size)
+        vectors = EmbeddingMatrix(os.path.join(root, "vectors"))
+        n, dim = len(vectors), vectors.dim
+        if dim % m:
+            raise ValueError(f"m={m} does not divide the embedding dimension {dim}")
+
+        rng = np.random.default_rng(seed)
+        sample = vectors.take(np.sort(rng.choice(n, min(n, train_size), replace=False)))
+        nlist = nlist or max(1, min(int(4 * np.sqrt(n)), len(sample) // 39))
+        centroids = kmeans(sample, nlist, iterations, seed)
+        residuals = (sample - centroids[assign(sample, centroids)]).reshape(len(sample), m, dim // m)
+        codebooks = np.stack([kmeans(residuals[:, j], 256, iterations, seed + j + 1) for j in range(m)])
+
+        labels = np.empty(n, dtype=np.int64)
+        codes = np.empty((n, m), dtype=np.uint8)
+        for start, block in vectors.iter_blocks(batch_size):
+            block = np.asarray(block, dtype=np.float32)
+            block_labels = assign(block, centroids)
+            labels[start:start + len(block)] = block_labels
+            codes[start:start + len(block)] = cls._encode(block - centroids[block_labels], codebooks)
+
+        order = np.argsort(labels, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=nlist))]).astype(np.int64)
+        np.save(os.path.join(root, "codes.npy"), codes[order])
+        np.save(os.path.join(root, "ids.npy"), order)
+        np.save(os.path.join(root, "offsets.npy"), offsets)
+        np.save(os.path.join(root, "centroids.npy"), centroids)
+        np.save(os.path.join(root, "codebooks.npy"), codebooks.astype(np.float32))
+        with open(os.path.join(root, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"rows": n, "dim": dim, "nlist": nlist, "m": m, "metric": metric, "source": embeddings_parquet}, f, indent=2)
+        print(f"✅ IVF-PQ index over {n} vectors (nlist={nlist}, m={m}) built in {time.perf_counter() - started:.1f}s.")
+        return cls(root)
+
+    @staticmethod
+    def _write_vectors(root, embeddings_parquet, metric, batch_size):
+        """Stream the Parquet file into vectors/ (float16) and docs.bin; cross-listed rows are stored once."""
+        columns = ["topic", "pdf_name", "chunk_id", "chunk_text", "embedding"]
+        matrix = EmbeddingMatrixWriter(os.path.join(root, "vectors"), "float16")
+        seen = set()
+        doc_offsets = [0]
+        with open(os.path.join(root, "docs.bin"), "wb") as docs:
+            for batch in ds.dataset(embeddings_parquet, format="parquet").to_batches(columns=columns, batch_size=batch_size):
+                embeddings = batch.column("embedding")
+                vectors = embeddings.flatten().to_numpy().reshape(batch.num_rows, embeddings.type.list_size)
+                values = {name: batch.column(name).to_pylist() for name in columns[:-1]}
+                keep = [i for i, chunk_id in enumerate(values["chunk_id"]) if chunk_id not in seen]
+                if not keep:
+                    continue
+                seen.update(values["chunk_id"][i] for i in keep)
+                vectors = vectors[keep].astype(np.float32)
+                if metric == "cosine":
+                    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+                matrix.write(vectors, *([values[name][i] for i in keep] for name in ("topic", "pdf_name", "chunk_id")))
+                for i in keep:
+                    record = {"page_content": values["chunk_text"][i], "metadata": {name: values[name][i] for name in columns[:3]}}
+                    data = json.dumps(record, ensure_ascii=False).encode("utf-8")
+                    docs.write(data)
+                    doc_offsets.append(doc_offsets[-1] + len(data))
+        matrix.close()
+        np.save(os.path.join(root, "doc_offsets.npy"), np.array(doc_offsets, dtype=np.int64))
+
+    @staticmethod
+    def _encode(residuals, codebooks):
+        m, _, dsub = codebooks.shape
+        residuals = residuals.reshape(len(residuals), m, dsub)
+        codes = np.empty((len(residuals), m), dtype=np.uint8)
+        for j in range(m):
+            scores = residuals[:, j] @ codebooks[j].T - (codebooks[j] ** 2).sum(axis=1) / 2
+            codes[:, j] = np.argmax(scores, axis=1)
+        return codes
+
+    def _prepare(self, queries):
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if self.metric == "cosine":
+            queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        return queries
+
+    def search(self, queries, k=10, nprobe=16, rerank=0):
+        """
+        Batched approximate search.
+
+        :param queries: (q, dim) array (or one vector).
+        :param nprobe: Inverted lists scanned per query; higher is slower with better recall.
+        :param rerank: Re-score this many PQ candidates exactly (float16 vectors); 0 disables.
+        :return: (scores, rows), both (q, k); rows index the stored vectors/docs, -1 where
+                 fewer than k candidates were found.
+        """
+        queries = self._prepare(queries)
+        nprobe = min(nprobe, len(self.centroids))
+        coarse = queries @ self.centroids.T
+        probes = np.argpartition(-(coarse - (self.centroids ** 2).sum(axis=1) / 2), nprobe - 1, axis=1)[:, :nprobe]
+        # Per-query lookup tables: inner product of each query subvector with every codeword
+        dsub = queries.shape[1] // self.m
+        tables = np.einsum("qmd,mkd->qmk", queries.reshape(len(queries), self.m, dsub), self.codebooks)
+        subspaces = np.arange(self.m)
+
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        rows = np.full((len(queries), k), -1, dtype=np.int64)
+        for i, lists in enumerate(probes):
+            spans = [(self.offsets[l], self.offsets[l + 1]) for l in lists]
+            sizes = [end - start for start, end in spans]
+            if not sum(sizes):
+                continue
+            codes = np.concatenate([self.codes[start:end] for start, end in spans])
+            candidates = np.concatenate([self.ids[start:end] for start, end in spans])
+            approx = tables[i][subspaces, codes].sum(axis=1) + np.repeat(coarse[i, lists], sizes)
+
+            keep = min(len(candidates), max(k, rerank))
+            best = np.argpartition(-approx, keep - 1)[:keep]
+            candidates, approx = candidates[best], approx[best]
+            if rerank:
+                approx = self.vectors.take(candidates) @ queries[i]
+            top = np.argsort(-approx)[:k]
+            scores[i, :len(top)] = approx[top]
+            rows[i, :len(top)] = candidates[top]
+        return scores, rows
+
+    def exact_search(self, queries, k=10, block_size=65536):
+        """Brute-force top-k over the stored vectors (ground truth for recall)."""
+        queries = self._prepare(queries)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        rows = np.full((len(queries), k), -1, dtype=np.int64)
+        for start, block in self.vectors.iter_blocks(block_size):
+            merged_scores = np.concatenate([scores, queries @ np.asarray(block, dtype=np.float32).T], axis=1)
+            merged_rows = np.concatenate([rows, np.broadcast_to(np.arange(start, start + len(block)), (len(queries), len(block)))], axis=1)
+            top = np.argsort(-merged_scores, axis=1)[:, :k]
+            scores, rows = np.take_along_axis(merged_scores, top, 1), np.take_along_axis(merged_rows, top, 1)
+        return scores, rows
+
+    def evaluate(self, queries=None, k=10, settings=((1, 0), (8, 0), (16, 0), (16, 100), (64, 100)), sample=200, seed=0):
+        """
+        Recall@k and latency for (nprobe, rerank) settings.
+
+        :param queries: Query vectors; default `sample` stored vectors.
+        :return: [{"nprobe", "rerank", "recall", "ms_per_query"}, ...]
+        """
+        if queries is None:
+            rng = np.random.default_rng(seed)
+            queries = self.vectors.take(np.sort(rng.choice(len(self), min(sample, len(self)), replace=False)))
+        _, truth = self.exact_search(queries, k)
+        results = []
+        for nprobe, rerank in settings:
+            started = time.perf_counter()
+            _, rows = self.search(queries, k, nprobe, rerank)
+            elapsed = time.perf_counter() - started
+            hits = sum(len(set(found[found >= 0]) & set(expected)) for found, expected in zip(rows, truth))
+            results.append({
+                "nprobe": nprobe, "rerank": rerank, "recall": round(hits / truth.size, 4),
+                "ms_per_query": round(1000 * elapsed / len(queries), 3),
+            })
+        return results
+
+    def records(self, rows):
+        """{"page_content", "metadata"} dicts of stored rows (-1 rows are skipped)."""
+        records = []
+        for row in rows:
+            if row >= 0:
+                start, end = self.doc_offsets[row], self.doc_offsets[row + 1]
+                records.append(json.loads(self.docs[start:end].tobytes().decode("utf-8")))
+        return records
+
+    def similarity_search_by_vector(self, embedding, k=4, nprobe=16, rerank=0):
+        """LangChain Documents for the k nearest chunks of one query vector."""
+        from langchain_core.documents import Document
+
+        _, rows = self.search(embedding, k, nprobe, rerank)
+        return [Document(id=record["metadata"]["chunk_id"], **record) for record in self.records(rows[0])]
+
+    def get_by_ids(self, ids):
+        """Documents for chunk_ids (unknown ids are skipped), as LangChain vector stores do."""
+        from langchain_core.documents import Document
+
+        rows = self.vectors.rows_for(ids)
+        return [Document(id=record["metadata"]["chunk_id"], **record) for record in self.records(rows)]
+
+    def version(self):
+        """Changes when the index is rebuilt (used by querycache.CachedVectorSearch)."""
+        return os.stat(os.path.join(self.root, "meta.json")).st_mtime_ns
+
+    def as_retriever(self, embeddings, k=4, nprobe=16, rerank=0):
+        """LangChain retriever that embeds queries with `embeddings` (see annretriever.IVFPQRetriever)."""
+        from annretriever import IVFPQRetriever
+
+        return IVFPQRetriever(index=self, embeddings=embeddings, k=k, nprobe=nprobe, rerank=rerank)
+
+
+if __name__ == "__main__":
+    index = IVFPQIndex.build("arxiv_data/ann")
+    for result in index.evaluate():
+        print(result)
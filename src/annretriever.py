@@ -0,0 +1,24 @@
+from typing import Any, List
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+
+class IVFPQRetriever(BaseRetriever):
+    """
+    LangChain retriever over an IVFPQIndex (annindex.py): the query is embedded
+    with `embeddings.embed_query` and searched in-process, with no vector store
+    round trip. Drop-in for Chroma(...).as_retriever() / similarity_search.
+    """
+
+    index: Any
+    embeddings: Any
+    k: int = 4
+    nprobe: int = 16
+    rerank: int = 0
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.similarity_search(query, self.k)
+
+    def similarity_search(self, query: str, k: int = 4) -> List[Document]:
+        return self.index.similarity_search_by_vector(self.embeddings.embed_query(query), k, self.nprobe, self.rerank)
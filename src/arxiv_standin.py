@@ -0,0 +1,224 @@
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from xml.sax.saxutils import escape
+
+
+def synthetic_pdf(arxiv_id, size):
+    """Deterministic, structurally valid PDF of roughly `size` bytes."""
+    header = b"%PDF-1.4\n"
+    trailer = b"\n%%EOF\n"
+    rng = random.Random(arxiv_id)
+    filler_len = max(0, size - len(header) - len(trailer))
+    filler = bytes(rng.getrandbits(8) for _ in range(min(filler_len, 4096)))
+    filler = (filler * (filler_len // max(len(filler), 1) + 1))[:filler_len]
+    return header + filler + trailer
+
+
+class ArxivStandIn:
+    """
+    Local stand-in for the arXiv API and PDF mirror.
+
+    Serves Atom search results at `/api/query` and synthetic PDFs at
+    `/pdf/<id>` (with Range support), with configurable latency, throughput
+    and error injection. Point an `arxiv.Client` at it via `client_for()`.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.05,
+        bytes_per_second: float = None,
+        error_rate: float = 0.0,
+        truncate_rate: float = 0.0,
+        pdf_size: int = 500_000,
+        cross_list_fraction: float = 0.2,
+        seed: int = 0,
+    ):
+        """
+        :param latency: Seconds to wait before answering each request.
+        :param bytes_per_second: Throttle for PDF bodies; None streams as fast as possible.
+        :param error_rate: Probability that a request is answered with HTTP 503.
+        :param truncate_rate: Probability that a PDF body is cut off half-way.
+        :param pdf_size: Approximate size of each synthetic PDF.
+        :param cross_list_fraction: Share of each topic's results that also appear under every other topic.
+        """
+        self.latency = latency
+        self.bytes_per_second = bytes_per_second
+        self.error_rate = error_rate
+        self.truncate_rate = truncate_rate
+        self.pdf_size = pdf_size
+        self.cross_list_fraction = cross_list_fraction
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.stats = {"api_requests": 0, "pdf_requests": 0, "errors_injected": 0, "truncations_injected": 0}
+
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                standin._handle(self)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def client_for(self, **kwargs):
+        """Return an arxiv.Client that queries this stand-in instead of export.arxiv.org."""
+        import arxiv
+
+        kwargs.setdefault("delay_seconds", 0)
+        client = arxiv.Client(**kwargs)
+        client.query_url_format = self.url + "/api/query?{}"
+        return client
+
+    def _chance(self, p):
+        with self.rng_lock:
+            return self.rng.random() < p
+
+    def _count(self, key):
+        with self.rng_lock:
+            self.stats[key] += 1
+
+    def paper_ids(self, query, start, count):
+        """Deterministic IDs for a query; every n-th result is shared across all queries."""
+        every = round(1 / self.cross_list_fraction) if self.cross_list_fraction else 0
+        prefix = 2402 + zlib.crc32(query.encode()) % 97
+        ids = []
+        for i in range(start, start + count):
+            if every and i % every == 0:
+                ids.append(f"2401.{i:05d}v1")
+            else:
+                ids.append(f"{prefix:04d}.{i:05d}v1")
+        return ids
+
+    def _handle(self, request):
+        time.sleep(self.latency)
+        path = urlparse(request.path)
+
+        if path.path == "/api/query":
+            self._count("api_requests")
+        elif path.path.startswith("/pdf/"):
+            self._count("pdf_requests")
+        else:
+            request.send_error(404)
+            return
+
+        if self._chance(self.error_rate):
+            self._count("errors_injected")
+            request.send_response(503)
+            request.send_header("Content-Length", "0")
+            request.end_headers()
+            return
+
+        if path.path == "/api/query":
+            self._serve_feed(request, parse_qs(path.query))
+        else:
+            self._serve_pdf(request, path.path[len("/pdf/"):])
+
+    def _serve_feed(self, request, args):
+        query = args.get("search_query", [""])[0]
+        start = int(args.get("start", ["0"])[0])
+        max_results = int(args.get("max_results", ["10"])[0])
+        total = 100_000
+        now = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+        entries = []
+        for i, arxiv_id in enumerate(self.paper_ids(query, start, max_results)):
+            stamp = (now - timedelta(minutes=start + i)).strftime("%Y-%m-%dT%H:%M:%SZ")
+            entries.append(f"""
+  <entry>
+    <id>http://arxiv.org/abs/{arxiv_id}</id>
+    <updated>{stamp}</updated>
+    <published>{stamp}</published>
+    <title>Synthetic paper {arxiv_id}</title>
+    <summary>Synthetic abstract for {escape(query)}.</summary>
+    <author><name>Stand-in Author</name></author>
+    <link href="http://arxiv.org/abs/{arxiv_id}" rel="alternate" type="text/html"/>
+    <link title="pdf" href="{self.url}/pdf/{arxiv_id}" rel="related" type="application/pdf"/>
+    <arxiv:primary_category xmlns:arxiv="http://arxiv.org/schemas/atom" term="{escape(query)}" scheme="http://arxiv.org/schemas/atom"/>
+    <category term="{escape(query)}" scheme="http://arxiv.org/schemas/atom"/>
+  </entry>""")
+
+        body = f"""<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom" xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/" xmlns:arxiv="http://arxiv.org/schemas/atom">
+  <title type="html">ArXiv Query: {escape(query)}</title>
+  <id>{self.url}/api/query</id>
+  <updated>{now.strftime("%Y-%m-%dT%H:%M:%SZ")}</updated>
+  <opensearch:totalResults>{total}</opensearch:totalResults>
+  <opensearch:startIndex>{start}</opensearch:startIndex>
+  <opensearch:itemsPerPage>{max_results}</opensearch:itemsPerPage>{"".join(entries)}
+</feed>
+""".encode("utf-8")
+
+        request.send_response(200)
+        request.send_header("Content-Type", "application/atom+xml")
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    def _serve_pdf(self, request, arxiv_id):
+        pdf = synthetic_pdf(arxiv_id, self.pdf_size)
+        start = 0
+        range_header = request.headers.get("Range")
+        if range_header and range_header.startswith("bytes="):
+            start = int(range_header[len("bytes="):].split("-")[0])
+            if start >= len(pdf):
+                request.send_response(416)
+                request.send_header("Content-Range", f"bytes */{len(pdf)}")
+                request.send_header("Content-Length", "0")
+                request.end_headers()
+                return
+
+        data = pdf[start:]
+        request.send_response(206 if start else 200)
+        request.send_header("Content-Type", "application/pdf")
+        request.send_header("Content-Length", str(len(data)))
+        if start:
+            request.send_header("Content-Range", f"bytes {start}-{len(pdf) - 1}/{len(pdf)}")
+        request.end_headers()
+
+        if self._chance(self.truncate_rate):
+            self._count("truncations_injected")
+            data = data[: len(data) // 2]
+            request.close_connection = True
+
+        block = 1 << 16
+        for offset in range(0, len(data), block):
+            request.wfile.write(data[offset:offset + block])
+            if self.bytes_per_second:
+                time.sleep(block / self.bytes_per_second)
+        request.wfile.flush()
+
+
+if __name__ == "__main__":
+    standin = ArxivStandIn(port=8089).start()
+    print(f"arXiv stand-in serving on {standin.url} (Ctrl+C to stop)")
+    try:
+        standin.thread.join()
+    except KeyboardInterrupt:
+        standin.stop()
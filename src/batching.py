@@ -0,0 +1,55 @@
+import numpy as np
+
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token) for chunks stored without one."""
+    return len(text) // 4 + 1
+
+
+def pack_by_tokens(token_counts, max_tokens=8192, max_items=256):
+    """
+    Group items into embedding requests of similar length.
+
+    Items are sorted by token count and packed greedily while the padded
+    size of the request (items x longest item) stays within max_tokens,
+    so short chunks travel in large requests and long ones in small
+    requests instead of fixed-count batches that overflow or underuse
+    the server. An item longer than max_tokens gets a request of its own.
+
+    :param token_counts: Token count per item (None is treated as 1).
+    :param max_tokens: Padded token budget per request.
+    :param max_items: Upper bound on items per request.
+    :return: Lists of item indices, one per request; every index appears once.
+    """
+    order = sorted(range(len(token_counts)), key=lambda i: token_counts[i] or 1)
+    requests, current, longest = [], [], 0
+    for i in order:
+        tokens = token_counts[i] or 1
+        if current and (max(longest, tokens) * (len(current) + 1) > max_tokens or len(current) >= max_items):
+            requests.append(current)
+            current, longest = [], 0
+        current.append(i)
+        longest = max(longest, tokens)
+    if current:
+        requests.append(current)
+    return requests
+
+
+def unpack(requests, results, count):
+    """
+    Put per-request results back in item order.
+
+    :param requests: Index lists from pack_by_tokens.
+    :param results: One (len(request), dim) array per request.
+    :return: float32 array of shape (count, dim).
+    """
+    results = [np.asarray(result, dtype=np.float32) for result in results]
+    vectors = np.empty((count, results[0].shape[1]), dtype=np.float32)
+    for indices, result in zip(requests, results):
+        vectors[indices] = result
+    return vectors
+
+
+def padded_tokens(requests, token_counts):
+    """Tokens the server processes for these requests when each is padded to its longest item."""
+    return sum(len(indices) * max(token_counts[i] or 1 for i in indices) for indices in requests)
@@ -0,0 +1,100 @@
+import io
+import os
+import time
+import shutil
+import tempfile
+import importlib.util
+from contextlib import redirect_stdout
+from arxiv_standin import ArxivStandIn
+
+
+def load_downloader():
+    """Import ArxivPDFDownloader from the stage-01 script (its filename is not a valid module name)."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "01-arxiv2pdf.py")
+    spec = importlib.util.spec_from_file_location("arxiv2pdf", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.ArxivPDFDownloader
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class DownloadBenchmark:
+    """
+    Run ArxivPDFDownloader against a local ArxivStandIn and report
+    papers/sec, p50/p99 download latency and retry counts.
+    """
+
+    def __init__(self, topics: list, papers_per_topic: int = 20, standin_options: dict = None):
+        """
+        :param topics: Queries to search (the stand-in accepts any string).
+        :param papers_per_topic: Results requested per topic.
+        :param standin_options: Keyword arguments for ArxivStandIn (latency, error_rate, ...).
+        """
+        self.topics = topics
+        self.papers_per_topic = papers_per_topic
+        self.standin_options = standin_options or {}
+        self.downloader_cls = load_downloader()
+
+    def run(self, max_workers=1, requests_per_second=100.0, burst=10, retry_backoff=0.05):
+        standin = ArxivStandIn(**self.standin_options).start()
+        save_dir = tempfile.mkdtemp(prefix="arxiv_bench_")
+        try:
+            downloader = self.downloader_cls(
+                topics=self.topics,
+                papers_per_topic=self.papers_per_topic,
+                save_dir=save_dir,
+                max_workers=max_workers,
+                requests_per_second=requests_per_second,
+                burst=burst,
+                client=standin.client_for(),
+                retry_backoff=retry_backoff,
+            )
+
+            started = time.perf_counter()
+            with redirect_stdout(io.StringIO()):
+                downloader.download_pdfs()
+            elapsed = time.perf_counter() - started
+            downloader.manifest.close()
+
+            stats = downloader.download_stats
+            latencies = [seconds for _, seconds, _, ok in stats if ok]
+            return {
+                "max_workers": max_workers,
+                "papers": len(latencies),
+                "failed": sum(1 for *_, ok in stats if not ok),
+                "seconds": elapsed,
+                "papers_per_sec": len(latencies) / elapsed if elapsed else 0.0,
+                "p50_latency": percentile(latencies, 50),
+                "p99_latency": percentile(latencies, 99),
+                "retries": sum(retries for _, _, retries, _ in stats),
+                "errors_injected": standin.stats["errors_injected"],
+                "truncations_injected": standin.stats["truncations_injected"],
+            }
+        finally:
+            standin.stop()
+            shutil.rmtree(save_dir, ignore_errors=True)
+
+    def report(self, result):
+        print(
+            f"workers={result['max_workers']:>3}  papers={result['papers']:>5}  failed={result['failed']:>3}  "
+            f"{result['papers_per_sec']:8.2f} papers/s  p50={result['p50_latency'] * 1000:7.1f}ms  "
+            f"p99={result['p99_latency'] * 1000:7.1f}ms  retries={result['retries']}"
+        )
+
+
+if __name__ == "__main__":
+    benchmark = DownloadBenchmark(
+        topics=["cs.LG", "cs.CV", "cs.CL", "cs.AI", "stat.ML"],
+        papers_per_topic=20,
+        standin_options={"latency": 0.05, "bytes_per_second": 20_000_000, "error_rate": 0.02, "truncate_rate": 0.02},
+    )
+
+    for workers in (1, 4, 16):
+        benchmark.report(benchmark.run(max_workers=workers))
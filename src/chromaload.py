@@ -0,0 +1,93 @@
+import time
+import numpy as np
+import pyarrow.dataset as ds
+
+METADATA_COLUMNS = ["topic", "chunk_id", "pdf_name"]
+
+
+class ChromaBulkLoader:
+    """
+    Load stage 04's precomputed embeddings (all_chunks_with_embeddings.parquet)
+    into a Chroma collection without calling the embedding model.
+
+    The Parquet file is streamed in batches of `batch_size` rows, and each
+    batch goes to Chroma as one upsert of ids, float32 vectors, texts and
+    metadata (topic, chunk_id, pdf_name, as in ChunkStore.documents). Ids are
+    chunk_ids, so re-running the load is idempotent; a cross-listed chunk is
+    one record (the last topic loaded wins).
+
+    The collection can then be opened with langchain_chroma.Chroma using the
+    same embedding model for queries.
+    """
+
+    def __init__(
+        self,
+        persist_directory="./chroma_db",
+        collection_name="arxiv",
+        embeddings_parquet="arxiv_data/all_chunks_with_embeddings.parquet",
+        batch_size=5000,
+    ):
+        """
+        :param persist_directory: Chroma persistence directory.
+        :param collection_name: Collection to create or extend.
+        :param embeddings_parquet: Stage 04 output with chunk_text and embedding columns.
+        :param batch_size: Rows per upsert (capped at the Chroma client's maximum).
+        """
+        import chromadb
+
+        self.client = chromadb.PersistentClient(path=persist_directory)
+        self.collection = self.client.get_or_create_collection(collection_name)
+        self.embeddings_parquet = embeddings_parquet
+        max_batch_size = getattr(self.client, "get_max_batch_size", lambda: batch_size)()
+        self.batch_size = min(batch_size, max_batch_size)
+
+    def _existing(self, ids):
+        return set(self.collection.get(ids=ids, include=[])["ids"])
+
+    def load(self, topics=None, skip_existing=False):
+        """
+        :param topics: Only load these topics (e.g., ["stat.ML"]); None loads all.
+        :param skip_existing: Leave chunk_ids already in the collection untouched instead
+                              of upserting them (cheap resume of an interrupted load).
+        :return: Number of records written.
+        """
+        dataset = ds.dataset(self.embeddings_parquet, format="parquet")
+        expression = ds.field("topic").isin(list(topics)) if topics is not None else None
+        batches = dataset.to_batches(
+            columns=METADATA_COLUMNS + ["chunk_text", "embedding"], filter=expression, batch_size=self.batch_size
+        )
+
+        written = 0
+        started = time.perf_counter()
+        for batch in batches:
+            if not batch.num_rows:
+                continue
+            embeddings = batch.column("embedding")
+            vectors = embeddings.flatten().to_numpy().reshape(batch.num_rows, embeddings.type.list_size)
+            columns = {name: batch.column(name).to_pylist() for name in METADATA_COLUMNS + ["chunk_text"]}
+
+            # Chroma rejects duplicate ids within one request; cross-listed copies keep the last row
+            rows = {chunk_id: i for i, chunk_id in enumerate(columns["chunk_id"])}
+            if skip_existing:
+                existing = self._existing(list(rows))
+                rows = {chunk_id: i for chunk_id, i in rows.items() if chunk_id not in existing}
+            if not rows:
+                continue
+
+            indices = np.fromiter(rows.values(), dtype=np.int64, count=len(rows))
+            self.collection.upsert(
+                ids=list(rows),
+                embeddings=vectors[indices],
+                documents=[columns["chunk_text"][i] for i in indices],
+                metadatas=[{name: columns[name][i] for name in METADATA_COLUMNS} for i in indices],
+            )
+            written += len(rows)
+            print(f"Upserted {written} records ({written / (time.perf_counter() - started):.0f}/s)...")
+
+        print(f"✅ {written} precomputed embeddings loaded into '{self.collection.name}' ({self.collection.count()} records).")
+        return written
+
+
+if __name__ == "__main__":
+    loader = ChromaBulkLoader()
+    loader.load()
@@ -0,0 +1,126 @@
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import threading
+from importlib import metadata
+from store import sha256_file
+
+ADDRESS_PATTERN = re.compile(r" at 0x[0-9a-fA-F]+")
+
+
+def chonkie_version() -> str:
+    try:
+        return metadata.version("chonkie")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def _param_value(value):
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_param_value(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _param_value(v) for k, v in value.items()}
+    # Objects (tokenizers, rules) by repr, without memory addresses that change every run
+    return ADDRESS_PATTERN.sub("", repr(value))
+
+
+def chunker_fingerprint(chunker) -> str:
+    """Stable hash of a chunker's class, parameters and the chonkie version."""
+    cls = type(chunker)
+    params = {k: _param_value(v) for k, v in sorted(vars(chunker).items()) if not k.startswith("__")}
+    payload = json.dumps(
+        {"class": f"{cls.__module__}.{cls.__qualname__}", "params": params, "chonkie": chonkie_version()},
+        sort_keys=True,
+        default=repr,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ChunkManifest:
+    """
+    SQLite record of what each paper's chunks in the chunk store were built
+    from: the sha256 of its markdown and the chunker fingerprint, plus the
+    topics it was written under. A paper whose markdown and chunker are
+    unchanged keeps its chunks as they are.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: Location of the SQLite file (e.g., arxiv_data/cache/chunks.sqlite).
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS documents (
+                pdf_name TEXT PRIMARY KEY,
+                md_sha256 TEXT NOT NULL,
+                chunker TEXT NOT NULL,
+                num_chunks INTEGER NOT NULL,
+                topics TEXT NOT NULL DEFAULT '[]'
+            );
+            CREATE TABLE IF NOT EXISTS md_hashes (
+                md_path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                sha256 TEXT NOT NULL
+            );
+        """)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(documents)")}
+        if "topics" not in columns:
+            self.conn.execute("ALTER TABLE documents ADD COLUMN topics TEXT NOT NULL DEFAULT '[]'")
+
+    def md_sha256(self, md_path):
+        """sha256 of a markdown file, memoized on (size, mtime) so unchanged files are not re-read."""
+        st = os.stat(md_path)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, sha256 FROM md_hashes WHERE md_path = ?", (md_path,)
+            ).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2]
+
+        digest = sha256_file(md_path)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO md_hashes (md_path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+                (md_path, st.st_size, st.st_mtime_ns, digest),
+            )
+        return digest
+
+    def documents(self):
+        """:return: {pdf_name: (md_sha256, chunker fingerprint, [topics], num_chunks)}"""
+        with self.lock:
+            rows = self.conn.execute("SELECT pdf_name, md_sha256, chunker, topics, num_chunks FROM documents").fetchall()
+        return {
+            pdf_name: (md_sha256, chunker, json.loads(topics), num_chunks)
+            for pdf_name, md_sha256, chunker, topics, num_chunks in rows
+        }
+
+    def replace_all(self, rows):
+        """
+        Make the manifest describe exactly the given documents; papers that are
+        no longer present are dropped.
+
+        :param rows: [(pdf_name, md_sha256, chunker fingerprint, num_chunks, [topics]), ...]
+        """
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM documents")
+            self.conn.executemany(
+                "INSERT INTO documents (pdf_name, md_sha256, chunker, num_chunks, topics) VALUES (?, ?, ?, ?, ?)",
+                [(*row[:4], json.dumps(sorted(row[4]))) for row in rows],
+            )
+
+    def clear(self):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM documents")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
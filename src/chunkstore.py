@@ -0,0 +1,213 @@
+import os
+import json
+import shutil
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Per-partition file schema; `topic` lives in the directory name (hive style)
+CHUNK_SCHEMA = pa.schema([
+    ("pdf_name", pa.dictionary(pa.int32(), pa.string())),
+    ("chunk_id", pa.string()),
+    ("chunk_text", pa.string()),
+    ("token_count", pa.int32()),
+])
+
+# Offset mode: byte ranges into a MarkdownCorpus instead of copies of the text
+OFFSET_SCHEMA = pa.schema([
+    ("doc_id", pa.int32()),
+    ("pdf_name", pa.dictionary(pa.int32(), pa.string())),
+    ("chunk_id", pa.string()),
+    ("start", pa.int64()),
+    ("end", pa.int64()),
+    ("token_count", pa.int32()),
+])
+
+
+def value_columns(schema):
+    """Columns a writer takes per chunk (everything but pdf_name and chunk_id)."""
+    return [name for name in schema.names if name not in ("pdf_name", "chunk_id")]
+
+
+class _PartitionWriter:
+    """Buffer rows for one topic and write them as row groups of `row_group_size` rows."""
+
+    def __init__(self, path, row_group_size, schema=CHUNK_SCHEMA):
+        self.path = path
+        self.schema = schema
+        self.values = value_columns(schema)
+        # Leading dot: pyarrow datasets skip it while it is being written
+        self.tmp_path = os.path.join(os.path.dirname(path), "." + os.path.basename(path) + ".tmp")
+        self.row_group_size = row_group_size
+        self.columns = {name: [] for name in schema.names}
+        self.rows = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.writer = pq.ParquetWriter(
+            self.tmp_path, schema, compression="SNAPPY", use_dictionary=["pdf_name"]
+        )
+
+    def write(self, pdf_name, chunks):
+        """
+        :param chunks: Value tuples in chunk order: (chunk_text, token_count), or
+                       (doc_id, start, end, token_count) for OFFSET_SCHEMA.
+        """
+        for idx, values in enumerate(chunks, start=1):
+            self.columns["pdf_name"].append(pdf_name)
+            self.columns["chunk_id"].append(f"{pdf_name}_chunk_{idx}")
+            for name, value in zip(self.values, values):
+                self.columns[name].append(value)
+        self.rows += len(chunks)
+        if len(self.columns["chunk_id"]) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if self.columns["chunk_id"]:
+            table = pa.Table.from_pydict(self.columns, schema=self.schema)
+            self.writer.write_table(table, row_group_size=self.row_group_size)
+            self.columns = {name: [] for name in self.schema.names}
+
+    def commit(self):
+        self.flush()
+        self.writer.close()
+        os.replace(self.tmp_path, self.path)
+
+
+class ChunkStore:
+    """
+    Chunk dataset written by stage 03: Parquet files partitioned by topic
+    (`<root>/topic=<topic>/part-0.parquet`), rows ordered by pdf_name and
+    chunk index, `pdf_name` dictionary-encoded. Readers get column projection
+    and partition/predicate pushdown through pyarrow.dataset, e.g. only
+    `chunk_text` of `stat.ML`.
+
+    In offset mode (linked to a MarkdownCorpus) rows hold byte ranges instead
+    of text; `chunk_text` is decoded from the memory-mapped corpus only for
+    the batches and columns a reader asks for.
+    """
+
+    def __init__(self, root: str):
+        """
+        :param root: Dataset directory (e.g., arxiv_data/all_chunks).
+        """
+        self.root = root
+        self._corpus = None
+
+    @property
+    def corpus_link(self):
+        # Leading underscore: pyarrow datasets skip it
+        return os.path.join(self.root, "_corpus.json")
+
+    @property
+    def offsets(self):
+        return os.path.exists(self.corpus_link)
+
+    def link_corpus(self, corpus_root):
+        """Switch the store to offset mode against the corpus at corpus_root (None switches back)."""
+        if corpus_root is None:
+            if self.offsets:
+                os.remove(self.corpus_link)
+            return
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.corpus_link, "w", encoding="utf-8") as f:
+            json.dump({"corpus": os.path.relpath(corpus_root, self.root)}, f)
+
+    @property
+    def corpus(self):
+        if self._corpus is None:
+            from corpus import MarkdownCorpus
+
+            with open(self.corpus_link, encoding="utf-8") as f:
+                self._corpus = MarkdownCorpus(os.path.join(self.root, json.load(f)["corpus"]))
+        return self._corpus
+
+    def partition_path(self, topic):
+        return os.path.join(self.root, f"topic={topic}", "part-0.parquet")
+
+    def topics(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name[len("topic="):] for name in os.listdir(self.root)
+            if name.startswith("topic=") and os.path.exists(os.path.join(self.root, name, "part-0.parquet"))
+        )
+
+    def writer(self, topic, row_group_size=4096):
+        """Open a writer that replaces the topic's partition when committed."""
+        schema = OFFSET_SCHEMA if self.offsets else CHUNK_SCHEMA
+        return _PartitionWriter(self.partition_path(topic), row_group_size, schema)
+
+    def remove(self, topic):
+        shutil.rmtree(os.path.dirname(self.partition_path(topic)), ignore_errors=True)
+
+    def papers(self, topic, batch_size=4096):
+        """Yield (pdf_name, [value tuple, ...]) from one partition, in file order (see _PartitionWriter.write)."""
+        parquet_file = pq.ParquetFile(self.partition_path(topic))
+        values = value_columns(parquet_file.schema_arrow)
+        current, chunks = None, []
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=["pdf_name"] + values):
+            names = batch.column("pdf_name").to_pylist()
+            rows = zip(*(batch.column(name).to_pylist() for name in values))
+            for pdf_name, row in zip(names, rows):
+                if pdf_name != current:
+                    if current is not None:
+                        yield current, chunks
+                    current, chunks = pdf_name, []
+                chunks.append(row)
+        if current is not None:
+            yield current, chunks
+
+    def dataset(self):
+        partitioning = ds.HivePartitioning.discover(infer_dictionary=True)
+        return ds.dataset(self.root, format="parquet", partitioning=partitioning)
+
+    def _filter(self, topics=None, filter=None):
+        expression = filter
+        if topics is not None:
+            topic_filter = ds.field("topic").isin(list(topics))
+            expression = topic_filter if expression is None else expression & topic_filter
+        return expression
+
+    def read(self, columns=None, topics=None, filter=None):
+        """
+        Load (part of) the store as a pyarrow Table.
+
+        :param columns: Columns to read, e.g. ["chunk_id", "chunk_text"]; None reads all.
+        :param topics: Only these topics (only their partitions are opened).
+        :param filter: Extra pyarrow.dataset expression, e.g. ds.field("pdf_name") == "2401.00001v1".
+        """
+        if not self.offsets:
+            return self.dataset().to_table(columns=columns, filter=self._filter(topics, filter))
+        return pa.Table.from_batches(list(self.iter_batches(columns, topics, filter)))
+
+    def iter_batches(self, columns=None, topics=None, filter=None, batch_size=4096):
+        """Stream record batches; memory stays bounded by batch_size."""
+        dataset = self.dataset()
+        wanted = columns or dataset.schema.names + (["chunk_text"] if self.offsets else [])
+        materialize = self.offsets and "chunk_text" in wanted
+        scan = ([name for name in wanted if name != "chunk_text"] + ["start", "end"]) if materialize else wanted
+
+        scanner = dataset.scanner(columns=list(dict.fromkeys(scan)), filter=self._filter(topics, filter), batch_size=batch_size)
+        for batch in scanner.to_batches():
+            if not batch.num_rows:
+                continue
+            if materialize:
+                texts = self.corpus.texts(batch.column("start").to_pylist(), batch.column("end").to_pylist())
+                arrays = {name: batch.column(name) for name in batch.schema.names}
+                arrays["chunk_text"] = pa.array(texts, type=pa.string())
+                batch = pa.RecordBatch.from_arrays([arrays[name] for name in wanted], names=wanted)
+            yield batch
+
+    def text(self, start, end):
+        """Text of one offset-mode chunk."""
+        return self.corpus.text(start, end)
+
+    def documents(self, topics=None, filter=None):
+        """LangChain Documents (chunk_text as content; topic, chunk_id, pdf_name as metadata)."""
+        from langchain_core.documents import Document
+
+        documents = []
+        for batch in self.iter_batches(columns=["topic", "chunk_id", "pdf_name", "chunk_text"], topics=topics, filter=filter):
+            for row in batch.to_pylist():
+                chunk_text = row.pop("chunk_text")
+                documents.append(Document(page_content=chunk_text, metadata=row))
+        return documents
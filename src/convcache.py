@@ -0,0 +1,203 @@
+import os
+import time
+import json
+import sqlite3
+import hashlib
+import threading
+from importlib import metadata
+from store import link_or_copy, sha256_file
+
+
+def options_fingerprint(pipeline_options) -> str:
+    """Stable hash of a PdfPipelineOptions (or any pydantic/plain options object)."""
+    if hasattr(pipeline_options, "model_dump_json"):
+        payload = pipeline_options.model_dump_json()
+    else:
+        payload = json.dumps(vars(pipeline_options), sort_keys=True, default=repr)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def docling_version() -> str:
+    try:
+        return metadata.version("docling")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+class ConversionCache:
+    """
+    Markdown cache keyed by (sha256 of the PDF, hash of the pipeline options,
+    docling version).
+
+    Entries live under `<root>/<key[:2]>/<key>.md` with an SQLite index that
+    tracks size and last use for LRU eviction once `max_bytes` is exceeded.
+    The index also remembers which key produced each markdown file on disk,
+    so a changed PDF or changed options is detected even when the .md exists.
+    """
+
+    def __init__(self, root: str, max_bytes: int = 5 * 1024 ** 3):
+        """
+        :param root: Cache directory (e.g., arxiv_data/cache/conversion).
+        :param max_bytes: Evict least recently used entries beyond this total size.
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+        self.conn = sqlite3.connect(os.path.join(root, "index.sqlite"), check_same_thread=False)
+        self.conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS outputs (
+                md_path TEXT PRIMARY KEY,
+                key TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS tiers (
+                key TEXT PRIMARY KEY,
+                arxiv_id TEXT,
+                tier TEXT NOT NULL,
+                metrics TEXT
+            );
+            CREATE TABLE IF NOT EXISTS pdf_hashes (
+                pdf_path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                sha256 TEXT NOT NULL,
+                pages INTEGER
+            );
+        """)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(pdf_hashes)")}
+        if "pages" not in columns:
+            self.conn.execute("ALTER TABLE pdf_hashes ADD COLUMN pages INTEGER")
+
+    @staticmethod
+    def make_key(pdf_sha256, options_hash, version):
+        return hashlib.sha256(f"{pdf_sha256}:{options_hash}:{version}".encode("utf-8")).hexdigest()
+
+    def pdf_sha256(self, pdf_path):
+        """sha256 of a PDF, memoized on (size, mtime) so unchanged files are not re-read."""
+        st = os.stat(pdf_path)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, sha256 FROM pdf_hashes WHERE pdf_path = ?", (pdf_path,)
+            ).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2]
+
+        digest = sha256_file(pdf_path)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pdf_hashes (pdf_path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+                (pdf_path, st.st_size, st.st_mtime_ns, digest),
+            )
+        return digest
+
+    def pdf_pages(self, pdf_path, count):
+        """
+        Page count of a PDF, memoized next to its sha256 so unchanged files are
+        not opened again. Call pdf_sha256 first; re-hashing a changed file
+        forgets its page count.
+
+        :param count: Called with pdf_path when the count is not known yet.
+        :return: Number of pages, or None if count raised.
+        """
+        st = os.stat(pdf_path)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, pages FROM pdf_hashes WHERE pdf_path = ?", (pdf_path,)
+            ).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns and row[2] is not None:
+            return row[2]
+
+        try:
+            pages = count(pdf_path)
+        except Exception:
+            return None
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE pdf_hashes SET pages = ? WHERE pdf_path = ? AND size = ? AND mtime_ns = ?",
+                (pages, pdf_path, st.st_size, st.st_mtime_ns),
+            )
+        return pages
+
+    def entry_path(self, key):
+        return os.path.join(self.root, key[:2], f"{key}.md")
+
+    def get(self, key):
+        """Return the cached markdown path for key, or None on a miss."""
+        path = self.entry_path(key)
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or not os.path.exists(path):
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+        return path
+
+    def put(self, key, md_path):
+        """Add a freshly written markdown file to the cache (hardlinked, not copied)."""
+        path = self.entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        link_or_copy(md_path, path)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries (key, size, last_used) VALUES (?, ?, ?)",
+                (key, os.path.getsize(path), time.time()),
+            )
+        self.evict()
+
+    def output_key(self, md_path):
+        """Key that produced md_path, or None if it predates the cache."""
+        with self.lock:
+            row = self.conn.execute("SELECT key FROM outputs WHERE md_path = ?", (md_path,)).fetchone()
+        return row[0] if row else None
+
+    def record_outputs(self, key, md_paths):
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO outputs (md_path, key) VALUES (?, ?)",
+                [(md_path, key) for md_path in md_paths],
+            )
+
+    def record_tier(self, key, arxiv_id, tier, metrics):
+        """Remember which converter tier (e.g., "fast" or "docling") produced an entry, with its quality metrics."""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO tiers (key, arxiv_id, tier, metrics) VALUES (?, ?, ?, ?)",
+                (key, arxiv_id, tier, json.dumps(metrics, sort_keys=True)),
+            )
+
+    def tier_report(self):
+        """Return [(arxiv_id, tier, metrics dict), ...] for every recorded conversion."""
+        with self.lock:
+            rows = self.conn.execute("SELECT arxiv_id, tier, metrics FROM tiers ORDER BY arxiv_id").fetchall()
+        return [(arxiv_id, tier, json.loads(metrics or "{}")) for arxiv_id, tier, metrics in rows]
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes."""
+        with self.lock, self.conn:
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for key, size in self.conn.execute(
+                "SELECT key, size FROM entries ORDER BY last_used"
+            ).fetchall():
+                if total <= self.max_bytes:
+                    break
+                path = self.entry_path(key)
+                if os.path.exists(path):
+                    os.remove(path)
+                self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                total -= size
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
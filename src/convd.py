@@ -0,0 +1,301 @@
+import os
+import json
+import time
+import queue
+import shutil
+import tempfile
+import threading
+import importlib.util
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse
+import requests
+
+
+class ConversionError(Exception):
+    """The daemon could not convert a document (bad PDF, docling error, queue full)."""
+
+
+def load_pdf2markdown():
+    """Import the stage-02 script (its filename is not a valid module name)."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "02-pdf2markdown.py")
+    spec = importlib.util.spec_from_file_location("pdf2markdown", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class _Job:
+    def __init__(self, pdf_path, page_range):
+        self.pdf_path = pdf_path
+        self.page_range = page_range
+        self.markdown = None
+        self.error = None
+        self.seconds = 0.0
+        self.done = threading.Event()
+
+
+class ConversionDaemon:
+    """
+    Long-lived local conversion service that keeps docling converters warm,
+    so small incremental batches don't pay the model start-up cost on every run.
+
+    Endpoints (localhost HTTP):
+      POST /convert  JSON {"pdf_path": ..., "page_range": [start, end]} or a raw
+                     application/pdf body; answers with the markdown.
+      GET  /health   JSON with queue depth, counters and throughput.
+
+    Requests wait in a bounded queue; when it is full the daemon answers 503
+    right away instead of piling up work.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8090, num_workers: int = 1, queue_size: int = 64):
+        """
+        :param num_workers: Conversion threads, each with its own warm DocumentConverter.
+        :param queue_size: Maximum number of requests waiting for a worker.
+        """
+        self.pdf2markdown = load_pdf2markdown()
+        self.pipeline_options = self.pdf2markdown.build_pipeline_options()
+        self.options_hash = self.pdf2markdown.options_fingerprint(self.pipeline_options)
+        self.docling_version = self.pdf2markdown.docling_version()
+        self.num_workers = num_workers
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.stats = {"completed": 0, "failed": 0, "rejected": 0, "in_flight": 0, "busy_seconds": 0.0, "pages": 0}
+
+        print(f"🔍 Warming {num_workers} docling converter(s)...")
+        self.workers = []
+        for _ in range(num_workers):
+            converter = self.pdf2markdown.build_converter(self.pipeline_options)
+            self.workers.append(threading.Thread(target=self._work, args=(converter,), daemon=True))
+
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                daemon._handle_get(self)
+
+            def do_POST(self):
+                daemon._handle_post(self)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        for _ in self.workers:
+            self.queue.put(None)
+
+    def health(self):
+        with self.lock:
+            stats = dict(self.stats)
+        uptime = time.time() - self.started_at
+        done = stats["completed"] + stats["failed"]
+        return {
+            "status": "ok",
+            "workers": self.num_workers,
+            "queue_depth": self.queue.qsize(),
+            "queue_size": self.queue.maxsize,
+            "uptime_seconds": uptime,
+            "docs_per_second": stats["completed"] / uptime if uptime else 0.0,
+            "avg_seconds": stats["busy_seconds"] / done if done else 0.0,
+            "options_hash": self.options_hash,
+            "docling_version": self.docling_version,
+            **stats,
+        }
+
+    def _work(self, converter):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            with self.lock:
+                self.stats["in_flight"] += 1
+            started = time.perf_counter()
+            try:
+                job.markdown = self.pdf2markdown.convert_pdf(converter, job.pdf_path, job.page_range)
+            except Exception as e:
+                job.error = f"{type(e).__name__}: {e}"
+            job.seconds = time.perf_counter() - started
+            with self.lock:
+                self.stats["in_flight"] -= 1
+                self.stats["busy_seconds"] += job.seconds
+                if job.error is None:
+                    self.stats["completed"] += 1
+                    if job.page_range:
+                        self.stats["pages"] += job.page_range[1] - job.page_range[0] + 1
+                else:
+                    self.stats["failed"] += 1
+            job.done.set()
+
+    def _send(self, request, status, body, content_type="application/json", headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body)
+        data = body.encode("utf-8")
+        request.send_response(status)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            request.send_header(name, value)
+        request.end_headers()
+
+        # Stream large documents back in blocks instead of one big write
+        block = 1 << 16
+        for offset in range(0, len(data), block):
+            request.wfile.write(data[offset:offset + block])
+
+    def _handle_get(self, request):
+        if urlparse(request.path).path == "/health":
+            self._send(request, 200, self.health())
+        else:
+            self._send(request, 404, {"error": "not found"})
+
+    def _handle_post(self, request):
+        if urlparse(request.path).path != "/convert":
+            self._send(request, 404, {"error": "not found"})
+            return
+
+        length = int(request.headers.get("Content-Length") or 0)
+        upload = None
+        try:
+            if request.headers.get("Content-Type", "").startswith("application/pdf"):
+                # Uploaded bytes go to a temp file; docling wants a path
+                fd, upload = tempfile.mkstemp(suffix=".pdf", prefix="convd_")
+                with os.fdopen(fd, "wb") as f:
+                    remaining = length
+                    while remaining:
+                        chunk = request.rfile.read(min(remaining, 1 << 16))
+                        if not chunk:
+                            break
+                        f.write(chunk)
+                        remaining -= len(chunk)
+                pdf_path, page_range = upload, None
+            else:
+                payload = json.loads(request.rfile.read(length) or b"{}")
+                pdf_path = payload.get("pdf_path")
+                page_range = tuple(payload["page_range"]) if payload.get("page_range") else None
+                if not pdf_path or not os.path.exists(pdf_path):
+                    self._send(request, 400, {"error": f"no such PDF: {pdf_path}"})
+                    return
+
+            job = _Job(pdf_path, page_range)
+            try:
+                self.queue.put_nowait(job)
+            except queue.Full:
+                with self.lock:
+                    self.stats["rejected"] += 1
+                self._send(request, 503, {"error": "queue full"}, headers={"Retry-After": "1"})
+                return
+
+            job.done.wait()
+            if job.error is not None:
+                self._send(request, 422, {"error": job.error})
+            else:
+                self._send(
+                    request, 200, job.markdown, content_type="text/markdown; charset=utf-8",
+                    headers={"X-Conversion-Seconds": f"{job.seconds:.3f}"},
+                )
+        finally:
+            if upload is not None:
+                os.remove(upload)
+
+
+class ConversionClient:
+    """Submit PDFs to a running ConversionDaemon."""
+
+    def __init__(self, url: str = "http://127.0.0.1:8090", timeout: float = 600, retries: int = 20, backoff: float = 0.5):
+        """
+        :param url: Base URL of the daemon.
+        :param timeout: Seconds to wait for one conversion.
+        :param retries: Times to retry while the daemon's queue is full.
+        :param backoff: Seconds between those retries (doubles up to 10s).
+        """
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.session = requests.Session()
+
+    def health(self):
+        response = self.session.get(self.url + "/health", timeout=10)
+        response.raise_for_status()
+        return response.json()
+
+    def _post(self, **kwargs):
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            response = self.session.post(self.url + "/convert", timeout=self.timeout, stream=True, **kwargs)
+            if response.status_code != 503 or attempt == self.retries:
+                break
+            response.close()
+            time.sleep(delay)
+            delay = min(delay * 2, 10.0)
+
+        if response.status_code != 200:
+            # Read and close the error body so the pooled connection is released
+            with response:
+                try:
+                    error = response.json().get("error")
+                except ValueError:
+                    error = response.text
+            raise ConversionError(f"HTTP {response.status_code}: {error}")
+        return response
+
+    def convert(self, pdf_path, page_range=None):
+        """
+        Convert a PDF the daemon can read from disk (same host).
+
+        :return: Markdown text.
+        """
+        payload = {"pdf_path": os.path.abspath(pdf_path), "page_range": list(page_range) if page_range else None}
+        response = self._post(json=payload)
+        response.encoding = "utf-8"
+        return response.text
+
+    def convert_to_file(self, pdf_path, md_path, upload=False):
+        """
+        Convert a PDF and stream the markdown straight to md_path.
+
+        :param upload: Send the PDF bytes instead of its path (daemon on another filesystem).
+        """
+        if upload:
+            # Bytes, not the file object: a retry after a 503 must resend the whole body
+            with open(pdf_path, "rb") as f:
+                body = f.read()
+            response = self._post(data=body, headers={"Content-Type": "application/pdf"})
+        else:
+            response = self._post(json={"pdf_path": os.path.abspath(pdf_path)})
+
+        tmp_path = md_path + ".tmp"
+        with response, open(tmp_path, "wb") as f:
+            shutil.copyfileobj(response.raw, f)
+        os.replace(tmp_path, md_path)
+
+
+if __name__ == "__main__":
+    # Example usage: keep converters warm for repeated 02-pdf2markdown.py runs
+    daemon = ConversionDaemon(port=8090, num_workers=2).start()
+    print(f"✅ Conversion daemon serving on {daemon.url} (Ctrl+C to stop)")
+    try:
+        daemon.thread.join()
+    except KeyboardInterrupt:
+        daemon.stop()
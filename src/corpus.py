@@ -0,0 +1,134 @@
+import os
+import mmap
+import sqlite3
+import hashlib
+import threading
+
+
+def char_to_byte_offsets(text, positions):
+    """Map character positions in text to byte positions in its UTF-8 encoding."""
+    if text.isascii():
+        return list(positions)
+    mapping, byte, previous = {}, 0, 0
+    for position in sorted(set(positions)):
+        byte += len(text[previous:position].encode("utf-8"))
+        mapping[position] = byte
+        previous = position
+    return [mapping[position] for position in positions]
+
+
+def chunk_spans(text, chunks):
+    """
+    Byte spans of chonkie chunks within the UTF-8 encoding of text.
+
+    :return: [(start, end, token_count), ...]
+    """
+    starts, ends, cursor = [], [], 0
+    for chunk in chunks:
+        start = getattr(chunk, "start_index", None)
+        if start is None:
+            # Chunkers without indices: locate the chunk text after the previous one
+            start = text.find(chunk.text, cursor)
+            start = cursor if start < 0 else start
+        end = getattr(chunk, "end_index", None) or start + len(chunk.text)
+        starts.append(start)
+        ends.append(end)
+        cursor = start
+    byte_offsets = char_to_byte_offsets(text, starts + ends)
+    return [
+        (byte_offsets[i], byte_offsets[len(starts) + i], getattr(chunk, "token_count", None))
+        for i, chunk in enumerate(chunks)
+    ]
+
+
+class MarkdownCorpus:
+    """
+    Append-only concatenation of every markdown document (UTF-8) in one file,
+    `<root>/corpus.bin`, read through a memory map, with an SQLite index of
+    where each document version starts.
+
+    Chunk stores in offset mode keep only (doc_id, start, end) byte ranges
+    into this file, and text is decoded from the map when a consumer asks
+    for it. A changed document is appended as a new version, so offsets
+    held by older chunk stores stay valid.
+    """
+
+    def __init__(self, root: str):
+        """
+        :param root: Corpus directory (e.g., arxiv_data/corpus).
+        """
+        self.root = root
+        self.path = os.path.join(root, "corpus.bin")
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        open(self.path, "ab").close()
+
+        self.conn = sqlite3.connect(os.path.join(root, "index.sqlite"), check_same_thread=False)
+        self.conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                pdf_name TEXT NOT NULL,
+                sha256 TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                UNIQUE (pdf_name, sha256)
+            );
+        """)
+        self.map = None
+        self.map_size = 0
+
+    def add(self, pdf_name, text):
+        """
+        Add a document unless this exact version is already stored.
+
+        :return: (doc_id, byte offset of the document in corpus.bin)
+        """
+        data = text.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        with self.lock, self.conn:
+            row = self.conn.execute(
+                "SELECT doc_id, offset FROM documents WHERE pdf_name = ? AND sha256 = ?", (pdf_name, digest)
+            ).fetchone()
+            if row is not None:
+                return row[0], row[1]
+
+            with open(self.path, "ab") as f:
+                offset = f.tell()
+                f.write(data)
+            cursor = self.conn.execute(
+                "INSERT INTO documents (pdf_name, sha256, offset, length) VALUES (?, ?, ?, ?)",
+                (pdf_name, digest, offset, len(data)),
+            )
+            return cursor.lastrowid, offset
+
+    def _mapped(self, end):
+        """The memory map, remapped if the file has grown past what is mapped."""
+        if self.map is None or end > self.map_size:
+            if self.map is not None:
+                self.map.close()
+            with open(self.path, "rb") as f:
+                self.map_size = os.fstat(f.fileno()).st_size
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.map_size else None
+        return self.map
+
+    def text(self, start, end):
+        """Decode the byte range [start, end) of the corpus."""
+        with self.lock:
+            return self._mapped(end)[start:end].decode("utf-8")
+
+    def texts(self, starts, ends):
+        with self.lock:
+            corpus = self._mapped(max(ends, default=0))
+            return [corpus[start:end].decode("utf-8") for start, end in zip(starts, ends)]
+
+    def size(self):
+        return os.path.getsize(self.path)
+
+    def close(self):
+        with self.lock:
+            if self.map is not None:
+                self.map.close()
+                self.map = None
+            self.conn.close()
+
@@ -0,0 +1,246 @@
+import os
+import re
+import json
+import zlib
+import hashlib
+from collections import Counter
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from chunkstore import ChunkStore
+from embcache import normalize_text
+
+TOKEN_PATTERN = re.compile(r"\w+")
+MERSENNE_PRIME = (1 << 31) - 1
+
+CANONICAL_SCHEMA = pa.schema([
+    ("topic", pa.dictionary(pa.int32(), pa.string())),
+    ("chunk_id", pa.string()),
+    ("canonical_id", pa.string()),
+    ("kind", pa.dictionary(pa.int8(), pa.string())),
+])
+
+
+def store_fingerprint(store):
+    """Hash of the chunk store's partition files (size and mtime), to tell whether a map is current."""
+    entries = []
+    for topic in store.topics():
+        stat = os.stat(store.partition_path(topic))
+        entries.append((topic, stat.st_size, stat.st_mtime_ns))
+    return hashlib.sha256(json.dumps(entries).encode("utf-8")).hexdigest()
+
+
+class MinHasher:
+    """
+    MinHash signatures of word k-shingles, computed with NumPy: shingle
+    hashes are built from per-token CRC32s by a rolling polynomial, and all
+    `num_perm` permutations are applied to all shingles as one array op.
+    """
+
+    def __init__(self, num_perm: int = 128, shingle: int = 5, seed: int = 1):
+        """
+        :param num_perm: Signature length (number of hash permutations).
+        :param shingle: Words per shingle.
+        """
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle = shingle
+        self.a = rng.integers(1, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+
+    def shingles(self, text):
+        tokens = np.array(
+            [zlib.crc32(token.encode("utf-8")) for token in TOKEN_PATTERN.findall(text.lower())], dtype=np.uint64
+        )
+        if not len(tokens):
+            return tokens
+        k = min(self.shingle, len(tokens))
+        hashes = np.zeros(len(tokens) - k + 1, dtype=np.uint64)
+        for j in range(k):
+            hashes = (hashes * np.uint64(1000003) + tokens[j:len(tokens) - k + 1 + j]) % np.uint64(MERSENNE_PRIME)
+        return np.unique(hashes)
+
+    def signature(self, text):
+        """uint32 signature of length num_perm; None for texts without words."""
+        hashes = self.shingles(text)
+        if not len(hashes):
+            return None
+        # (num_perm, shingles) permuted hashes; a * h stays below 2**62, so uint64 does not overflow
+        permuted = (self.a[:, None] * hashes[None, :] + self.b[:, None]) % np.uint64(MERSENNE_PRIME)
+        return permuted.min(axis=1).astype(np.uint32)
+
+
+class _SignatureIndex:
+    """
+    MinHash signatures of canonical chunks as rows of one growable uint32
+    matrix, with LSH band buckets holding row numbers, so all candidates of
+    a chunk are compared with a single array operation.
+    """
+
+    def __init__(self, num_perm, bands, capacity=1024):
+        self.bands = bands
+        self.matrix = np.empty((capacity, num_perm), dtype=np.uint32)
+        self.ids = []
+        self.buckets = {}     # (band, band bytes) -> row numbers
+
+    def keys(self, signature):
+        return [(band, values.tobytes()) for band, values in enumerate(signature.reshape(self.bands, -1))]
+
+    def match(self, signature, keys, threshold):
+        """Id of the earliest indexed chunk whose estimated Jaccard similarity reaches threshold, or None."""
+        hits = [self.buckets[key] for key in keys if key in self.buckets]
+        if not hits:
+            return None
+        candidates = np.unique(np.concatenate(hits))
+        similarity = (self.matrix[candidates] == signature).mean(axis=1)
+        matches = np.flatnonzero(similarity >= threshold)
+        return self.ids[candidates[matches[0]]] if len(matches) else None
+
+    def add(self, chunk_id, signature, keys):
+        row = len(self.ids)
+        if row == len(self.matrix):
+            grown = np.empty((2 * len(self.matrix), self.matrix.shape[1]), dtype=np.uint32)
+            grown[:row] = self.matrix
+            self.matrix = grown
+        self.matrix[row] = signature
+        self.ids.append(chunk_id)
+        for key in keys:
+            self.buckets.setdefault(key, []).append(row)
+
+
+class ChunkDeduplicator:
+    """
+    Map every chunk of the chunk store to a canonical representative before
+    embedding, so only unique texts are sent to the model.
+
+    Exact duplicates share the sha256 of their normalized text. With
+    near=True the remaining texts go through MinHash/LSH: signatures are
+    split into `bands` bands, chunks sharing a band bucket with a canonical
+    chunk are compared on their signatures, and the first canonical whose
+    estimated Jaccard similarity reaches `threshold` absorbs them. The
+    first chunk seen (in store order) of each group is its canonical.
+
+    Writes `<save_dir>/dedup/canonical.parquet` (topic, chunk_id,
+    canonical_id, kind) and `stats.json` with duplicate rates. Copies of a
+    cross-listed chunk under other topics get kind "cross_listed"; they are
+    counted separately and not as duplicates, since the embedding stage
+    already reuses their vectors without a dedup map.
+    """
+
+    def __init__(
+        self, save_dir="arxiv_data", chunk_store="all_chunks", near=True, threshold=0.85,
+        num_perm=128, bands=32, shingle=5,
+    ):
+        """
+        :param chunk_store: Directory of the Parquet chunk store written by stage 03.
+        :param near: Also collapse near-duplicates (MinHash/LSH), not only exact ones.
+        :param threshold: Estimated Jaccard similarity at which two chunks count as duplicates.
+        :param num_perm: MinHash signature length; must be divisible by bands.
+        :param bands: LSH bands; more bands find less similar candidates.
+        :param shingle: Words per shingle.
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.store = ChunkStore(os.path.join(save_dir, chunk_store))
+        self.output_dir = os.path.join(save_dir, "dedup")
+        self.near = near
+        self.threshold = threshold
+        self.bands = bands
+        self.hasher = MinHasher(num_perm, shingle)
+
+    def run(self, batch_size=4096):
+        """:return: Stats dict (also written to stats.json)."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        fingerprint = store_fingerprint(self.store)
+        tmp_path = os.path.join(self.output_dir, ".canonical.parquet.tmp")
+        writer = pq.ParquetWriter(tmp_path, CANONICAL_SCHEMA, compression="SNAPPY")
+
+        exact = {}            # normalized-text hash -> canonical chunk_id
+        seen = {}             # chunk_id -> canonical chunk_id (cross-listed copies)
+        index = _SignatureIndex(self.hasher.num_perm, self.bands)
+        kinds = Counter()
+        repeats = Counter()
+        rows = 0
+
+        for batch in self.store.iter_batches(columns=["topic", "chunk_id", "chunk_text"], batch_size=batch_size):
+            columns = {name: [] for name in CANONICAL_SCHEMA.names}
+            for topic, chunk_id, text in zip(*(batch.column(name).to_pylist() for name in ("topic", "chunk_id", "chunk_text"))):
+                rows += 1
+                if chunk_id in seen:
+                    canonical, kind = seen[chunk_id], "cross_listed"
+                else:
+                    key = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+                    canonical, kind = exact.get(key), "exact"
+                    if canonical is None and self.near:
+                        canonical, kind = self._near(chunk_id, text, index), "near"
+                    if canonical is None:
+                        canonical, kind = chunk_id, "unique"
+                    exact.setdefault(key, canonical)
+                    seen[chunk_id] = canonical
+                if kind in ("exact", "near"):
+                    repeats[canonical] += 1
+                kinds[kind] += 1
+                for name, value in zip(CANONICAL_SCHEMA.names, (topic, chunk_id, canonical, kind)):
+                    columns[name].append(value)
+            writer.write_table(pa.Table.from_pydict(columns, schema=CANONICAL_SCHEMA))
+
+        writer.close()
+        os.replace(tmp_path, os.path.join(self.output_dir, "canonical.parquet"))
+
+        # Cross-listed copies are one chunk stored twice, not content the map deduplicates
+        distinct = rows - kinds["cross_listed"]
+        stats = {
+            "store": fingerprint,
+            "chunks": rows,
+            "cross_listed": kinds["cross_listed"],
+            "unique": kinds["unique"],
+            "exact_duplicates": kinds["exact"],
+            "near_duplicates": kinds["near"],
+            "duplicate_rate": round((kinds["exact"] + kinds["near"]) / distinct, 4) if distinct else 0.0,
+            "most_repeated": [{"canonical_id": chunk_id, "copies": count} for chunk_id, count in repeats.most_common(20)],
+            "config": {"near": self.near, "threshold": self.threshold, "num_perm": self.hasher.num_perm,
+                       "bands": self.bands, "shingle": self.hasher.shingle},
+        }
+        with open(os.path.join(self.output_dir, "stats.json"), "w", encoding="utf-8") as f:
+            json.dump(stats, f, indent=2)
+        print(
+            f"✅ {rows} chunks ({kinds['cross_listed']} cross-listed copies): {kinds['unique']} unique, "
+            f"{kinds['exact']} exact and {kinds['near']} near duplicates ({stats['duplicate_rate']:.1%} saved before embedding)."
+        )
+        return stats
+
+    def _near(self, chunk_id, text, index):
+        """Canonical id of a near-duplicate of text, or None (text then becomes a canonical itself)."""
+        signature = self.hasher.signature(text)
+        if signature is None:
+            return None
+        keys = index.keys(signature)
+        canonical = index.match(signature, keys, self.threshold)
+        if canonical is None:
+            index.add(chunk_id, signature, keys)
+        return canonical
+
+
+def load_canonical(save_dir="arxiv_data", chunk_store="all_chunks"):
+    """
+    {(topic, chunk_id): canonical_id} from the last dedup run, or None when
+    there is none or the chunk store has changed since.
+    """
+    root = os.path.join(save_dir, "dedup")
+    if not os.path.exists(os.path.join(root, "stats.json")):
+        return None
+    with open(os.path.join(root, "stats.json"), encoding="utf-8") as f:
+        stats = json.load(f)
+    if stats["store"] != store_fingerprint(ChunkStore(os.path.join(save_dir, chunk_store))):
+        print(f"⚠️ {root} is older than the chunk store; re-run dedup.py to use it.")
+        return None
+    table = pq.read_table(os.path.join(root, "canonical.parquet"), columns=["topic", "chunk_id", "canonical_id"])
+    return {
+        (topic, chunk_id): canonical
+        for topic, chunk_id, canonical in zip(*(table.column(name).to_pylist() for name in table.column_names))
+    }
+
+
+if __name__ == "__main__":
+    dedup = ChunkDeduplicator(save_dir="arxiv_data")
+    dedup.run()
@@ -0,0 +1,177 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+import numpy as np
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """NFC, trimmed, whitespace runs collapsed; texts that differ only in layout share an embedding."""
+    return WHITESPACE_PATTERN.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache keyed by (model_key, sha256 of the normalized
+    text), stored as float32 blobs in SQLite.
+
+    Lookups and inserts work on whole batches. Least recently used entries
+    are evicted once the stored vectors exceed `max_bytes`.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 4 * 1024 ** 3):
+        """
+        :param path: Location of the SQLite file (e.g., arxiv_data/cache/embeddings.sqlite).
+        :param max_bytes: Evict least recently used vectors beyond this total size.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used);
+        """)
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def make_key(model, text):
+        return hashlib.sha256(f"{model}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model, texts):
+        """
+        :return: One float32 vector (or None on a miss) per text, in order.
+        """
+        keys = [self.make_key(model, text) for text in texts]
+        found = {}
+        with self.lock:
+            # SQLite limits bound parameters, so look up in slices
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+                found.update(rows)
+            if found:
+                with self.conn:
+                    self.conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?", [(time.time(), key) for key in found]
+                    )
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+        return [np.frombuffer(found[key], dtype=np.float32) if key in found else None for key in keys]
+
+    def put_many(self, model, texts, vectors):
+        rows = []
+        for text, vector in zip(texts, vectors):
+            vector = np.asarray(vector, dtype=np.float32)
+            rows.append((self.make_key(model, text), model, vector.shape[0], vector.tobytes(), time.time()))
+        with self.lock, self.conn:
+            for key, *_ in rows:
+                old = self.conn.execute("SELECT LENGTH(vector) FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if old:
+                    self.total_bytes -= old[0]
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, dim, vector, last_used) VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self.total_bytes += sum(len(row[3]) for row in rows)
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def embed(self, model, texts, embed_fn):
+        """
+        Embeddings for texts, calling embed_fn(list of texts) only for the misses.
+
+        :return: float32 array of shape (len(texts), dim).
+        """
+        vectors, groups = self._lookup(model, texts)
+        if groups:
+            self._fill(model, texts, vectors, groups, embed_fn([texts[indices[0]] for indices in groups]))
+        return np.stack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+    async def aembed(self, model, texts, embed_fn):
+        """Same as embed, for a coroutine embed_fn (e.g. AsyncEmbeddingClient.embed)."""
+        vectors, groups = self._lookup(model, texts)
+        if groups:
+            self._fill(model, texts, vectors, groups, await embed_fn([texts[indices[0]] for indices in groups]))
+        return np.stack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+    def _lookup(self, model, texts):
+        """Cached vectors (None for misses) and the misses grouped by key; texts that normalize the same are sent once."""
+        vectors = self.get_many(model, texts)
+        by_key = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                by_key.setdefault(self.make_key(model, texts[i]), []).append(i)
+        return vectors, list(by_key.values())
+
+    def _fill(self, model, texts, vectors, groups, embedded):
+        embedded = np.asarray(embedded, dtype=np.float32)
+        self.put_many(model, [texts[indices[0]] for indices in groups], embedded)
+        for indices, vector in zip(groups, embedded):
+            for i in indices:
+                vectors[i] = vector
+
+    def evict(self):
+        """Drop least recently used vectors until the cache is back under 90% of max_bytes."""
+        target = self.max_bytes * 0.9
+        with self.lock, self.conn:
+            for key, size in self.conn.execute(
+                "SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used"
+            ).fetchall():
+                if self.total_bytes <= target:
+                    break
+                self.conn.execute("DELETE FROM embeddings WHERE key = ?", (key,))
+                self.total_bytes -= size
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "bytes": self.total_bytes,
+        }
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class CachedEmbeddings:
+    """
+    LangChain-style embeddings (embed_documents / embed_query) backed by an
+    EmbeddingCache, e.g. around OpenAIEmbeddings for Chroma ingestion.
+    """
+
+    def __init__(self, embeddings, cache: EmbeddingCache, model_key: str):
+        """
+        :param embeddings: Object with embed_documents(texts) and embed_query(text).
+        :param model_key: Name the vectors are cached under (the embedding model).
+        """
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_key = model_key
+
+    def embed_documents(self, texts):
+        return self.cache.embed(self.model_key, list(texts), self.embeddings.embed_documents).tolist()
+
+    def embed_query(self, text):
+        return self.cache.embed(self.model_key, [text], lambda texts: [self.embeddings.embed_query(texts[0])])[0].tolist()
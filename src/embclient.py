@@ -0,0 +1,125 @@
+import asyncio
+import random
+import numpy as np
+import httpx
+
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class EmbeddingAPIError(Exception):
+    pass
+
+
+class AsyncEmbeddingClient:
+    """
+    asyncio client for an OpenAI-compatible /v1/embeddings endpoint
+    (LM Studio, vLLM, OpenAI).
+
+    All requests share one pooled keep-alive connection pool; at most
+    `max_concurrency` batch requests are in flight at once, failed requests
+    (connection errors, 429 and 5xx) are retried with exponential backoff,
+    and results always come back in input order.
+    """
+
+    def __init__(
+        self,
+        api_url: str = "http://localhost:1234/v1/embeddings",
+        model: str = "text-embedding-qwen3-embedding-4b",
+        max_concurrency: int = 4,
+        retries: int = 5,
+        backoff: float = 0.5,
+        timeout: float = 120,
+        api_key: str = None,
+    ):
+        """
+        :param api_url: Full URL of the embeddings endpoint.
+        :param model: Model name sent with every request.
+        :param max_concurrency: Batch requests in flight at once (also the connection pool size).
+        :param retries: Retries per request before giving up.
+        :param backoff: Initial delay in seconds between retries; doubled after each attempt.
+        :param timeout: Seconds per request.
+        :param api_key: Sent as a Bearer token when set.
+        """
+        self.api_url = api_url
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            headers={"Authorization": f"Bearer {api_key}"} if api_key else None,
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+        )
+        self.requests = 0
+        self.retried = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    def _delay(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return self.backoff * 2 ** attempt * (1 + random.random() / 4)
+
+    async def embed(self, texts):
+        """
+        Embed one batch of texts in a single request.
+
+        :return: float32 array of shape (len(texts), dim), rows in input order.
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        async with self.semaphore:
+            for attempt in range(self.retries + 1):
+                response = None
+                try:
+                    self.requests += 1
+                    response = await self.client.post(self.api_url, json={"model": self.model, "input": list(texts)})
+                    if response.status_code not in RETRY_STATUS:
+                        break
+                    error = EmbeddingAPIError(f"{response.status_code}: {response.text[:200]}")
+                except httpx.TransportError as e:
+                    error = e
+                if attempt == self.retries:
+                    raise EmbeddingAPIError(f"Embedding request failed after {self.retries} retries: {error}")
+                self.retried += 1
+                await asyncio.sleep(self._delay(attempt, response))
+
+        if response.status_code != 200:
+            raise EmbeddingAPIError(f"{response.status_code}: {response.text[:200]}")
+        data = sorted(response.json()["data"], key=lambda item: item["index"])
+        if len(data) != len(texts):
+            raise EmbeddingAPIError(f"Expected {len(texts)} embeddings, got {len(data)}")
+        return np.asarray([item["embedding"] for item in data], dtype=np.float32)
+
+    async def embed_all(self, texts, batch_size=64):
+        """Embed any number of texts as concurrent batch requests; rows stay in input order."""
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        batches = [texts[start:start + batch_size] for start in range(0, len(texts), batch_size)]
+        return np.concatenate(await asyncio.gather(*(self.embed(batch) for batch in batches)))
+
+
+def embed_texts(texts, batch_size=64, **client_kwargs):
+    """Synchronous helper: embed texts with a short-lived AsyncEmbeddingClient."""
+
+    async def run():
+        async with AsyncEmbeddingClient(**client_kwargs) as client:
+            return await client.embed_all(texts, batch_size)
+
+    return asyncio.run(run())
+
+
+if __name__ == "__main__":
+    vectors = embed_texts(["Attention is all you need.", "Graph neural networks for molecules."])
+    print(vectors.shape)
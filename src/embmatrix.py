@@ -0,0 +1,164 @@
+import os
+import json
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+DTYPES = ("float32", "float16", "int8")
+# Fixed .npy header size, so the row count can be filled in once the matrix is complete
+HEADER_SIZE = 128
+
+INDEX_SCHEMA = pa.schema([
+    ("topic", pa.dictionary(pa.int32(), pa.string())),
+    ("pdf_name", pa.dictionary(pa.int32(), pa.string())),
+    ("chunk_id", pa.string()),
+])
+
+
+def _npy_header(dtype, rows, dim):
+    header = repr({"descr": np.lib.format.dtype_to_descr(np.dtype(dtype)), "fortran_order": False, "shape": (rows, dim)})
+    prefix = np.lib.format.magic(1, 0)
+    length = HEADER_SIZE - len(prefix) - 2
+    return prefix + length.to_bytes(2, "little") + header.ljust(length - 1).encode("latin1") + b"\n"
+
+
+def quantize_int8(vectors):
+    """Symmetric per-row int8 quantization; returns (int8 rows, float32 scales)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1.0
+    return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+
+class EmbeddingMatrixWriter:
+    """
+    Append embeddings to a contiguous `.npy` matrix as they are produced.
+
+    Writes `<root>/embeddings.npy` (float32, float16 or int8), `scales.npy`
+    (per-row float32 scales, int8 only), `index.parquet` (topic, pdf_name,
+    chunk_id of every row, in matrix order) and `meta.json`. Files are
+    written under temporary names and renamed on close.
+    """
+
+    def __init__(self, root: str, dtype: str = "float32", model_key: str = None):
+        """
+        :param root: Output directory (e.g., arxiv_data/embeddings).
+        :param dtype: "float32", "float16" or "int8".
+        :param model_key: Recorded in meta.json.
+        """
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported matrix dtype: {dtype}")
+        self.root = root
+        self.dtype = dtype
+        self.model_key = model_key
+        self.rows = 0
+        self.dim = None
+        os.makedirs(root, exist_ok=True)
+
+        self.matrix = open(self._tmp("embeddings.npy"), "wb")
+        self.matrix.write(b"\0" * HEADER_SIZE)
+        self.scales = []
+        self.index = pq.ParquetWriter(self._tmp("index.parquet"), INDEX_SCHEMA, compression="SNAPPY")
+
+    def _tmp(self, name):
+        return os.path.join(self.root, "." + name + ".tmp")
+
+    def write(self, vectors, topics, pdf_names, chunk_ids):
+        """:param vectors: (n, dim) array for rows whose index columns follow."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        if self.dtype == "int8":
+            vectors, scales = quantize_int8(vectors)
+            self.scales.append(scales)
+        self.matrix.write(np.ascontiguousarray(vectors, dtype=self.dtype).tobytes())
+        self.index.write_table(
+            pa.Table.from_pydict({"topic": topics, "pdf_name": pdf_names, "chunk_id": chunk_ids}, schema=INDEX_SCHEMA)
+        )
+        self.rows += len(vectors)
+
+    def close(self):
+        self.matrix.seek(0)
+        self.matrix.write(_npy_header(self.dtype, self.rows, self.dim or 0))
+        self.matrix.close()
+        self.index.close()
+        if self.dtype == "int8":
+            scales = np.concatenate(self.scales) if self.scales else np.zeros(0, dtype=np.float32)
+            with open(self._tmp("scales.npy"), "wb") as f:
+                np.save(f, scales)
+
+        names = ["embeddings.npy", "index.parquet"] + (["scales.npy"] if self.dtype == "int8" else [])
+        for name in names:
+            os.replace(self._tmp(name), os.path.join(self.root, name))
+        if self.dtype != "int8" and os.path.exists(os.path.join(self.root, "scales.npy")):
+            os.remove(os.path.join(self.root, "scales.npy"))
+        with open(os.path.join(self.root, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"dtype": self.dtype, "rows": self.rows, "dim": self.dim, "model": self.model_key}, f, indent=2)
+
+
+class EmbeddingMatrix:
+    """
+    Read side of EmbeddingMatrixWriter. `vectors` is a read-only memory map
+    of embeddings.npy, so opening a multi-million-row matrix costs no RAM;
+    float32 matrices are used as is, float16/int8 ones are converted to
+    float32 with `dense` (block by block) or `iter_blocks`.
+    """
+
+    def __init__(self, root: str):
+        """
+        :param root: Directory written by EmbeddingMatrixWriter (e.g., arxiv_data/embeddings).
+        """
+        self.root = root
+        with open(os.path.join(root, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.vectors = np.load(os.path.join(root, "embeddings.npy"), mmap_mode="r")
+        self.scales = np.load(os.path.join(root, "scales.npy"), mmap_mode="r") if self.meta["dtype"] == "int8" else None
+        self._row_ids = None
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    @property
+    def dim(self):
+        return self.vectors.shape[1]
+
+    def dense(self, start=0, stop=None, block_size=65536):
+        """
+        float32 rows [start, stop). A float32 matrix is returned as a zero-copy
+        view; float16/int8 rows are converted into one preallocated float32
+        array, block_size rows at a time, so no full-size temporaries are made.
+        """
+        if self.scales is None and self.vectors.dtype == np.float32:
+            return self.vectors[start:stop]
+        start, stop, _ = slice(start, stop).indices(len(self))
+        out = np.empty((max(stop - start, 0), self.dim), dtype=np.float32)
+        for offset in range(0, len(out), block_size):
+            rows = slice(start + offset, min(start + offset + block_size, stop))
+            block = out[offset:offset + block_size]
+            block[:] = self.vectors[rows]
+            if self.scales is not None:
+                block *= self.scales[rows, None]
+        return out
+
+    def iter_blocks(self, block_size=65536):
+        """Yield (start, float32 block) over the whole matrix."""
+        for start in range(0, len(self), block_size):
+            yield start, self.dense(start, start + block_size)
+
+    def index(self, columns=None):
+        """pyarrow Table of topic, pdf_name, chunk_id; row i describes matrix row i."""
+        return pq.read_table(os.path.join(self.root, "index.parquet"), columns=columns)
+
+    def rows_for(self, chunk_ids):
+        """Matrix rows of chunk_ids (first occurrence for cross-listed chunks); -1 if absent."""
+        if self._row_ids is None:
+            self._row_ids = {}
+            for row, chunk_id in enumerate(self.index(["chunk_id"]).column("chunk_id").to_pylist()):
+                self._row_ids.setdefault(chunk_id, row)
+        return np.array([self._row_ids.get(chunk_id, -1) for chunk_id in chunk_ids], dtype=np.int64)
+
+    def take(self, rows):
+        """float32 vectors of the given matrix rows."""
+        rows = np.asarray(rows, dtype=np.int64)
+        block = np.asarray(self.vectors[rows], dtype=np.float32)
+        return block * self.scales[rows, None] if self.scales is not None else block
@@ -0,0 +1,149 @@
+import os
+import time
+import shutil
+import sqlite3
+import threading
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+def embedding_schema(dim):
+    """Output schema: chunk columns plus a fixed-size float32 embedding."""
+    return pa.schema([
+        ("topic", pa.dictionary(pa.int32(), pa.string())),
+        ("pdf_name", pa.dictionary(pa.int32(), pa.string())),
+        ("chunk_id", pa.string()),
+        ("chunk_text", pa.string()),
+        ("token_count", pa.int32()),
+        ("embedding", pa.list_(pa.float32(), dim)),
+    ])
+
+
+class EmbeddingCheckpoint:
+    """
+    Durable progress of an embedding job: completed batches are committed as
+    Parquet part-files (`<root>/part-00000.parquet`, ...) and recorded in an
+    SQLite manifest (`<root>/progress.sqlite`) only after the file is fully
+    written and renamed into place. A part that was being written when the
+    job died is never listed, so it is simply overwritten on the next run.
+
+    A restarted job reads the (topic, chunk_id) keys of committed parts and
+    skips them; `finalize` compacts the parts into one Parquet file.
+    """
+
+    def __init__(self, root: str, model_key: str = None):
+        """
+        :param root: Directory for part-files and the manifest (e.g., arxiv_data/embedding_parts).
+        :param model_key: Embedding model of the job; parts made with another model are discarded.
+        """
+        self.root = root
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(root, "progress.sqlite"), check_same_thread=False)
+        self.conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS parts (
+                part INTEGER PRIMARY KEY,
+                path TEXT NOT NULL,
+                rows INTEGER NOT NULL,
+                committed_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS job (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
+        if model_key is not None:
+            row = self.conn.execute("SELECT value FROM job WHERE key = 'model'").fetchone()
+            if row is not None and row[0] != model_key:
+                print(f"⚠️ Checkpoint in {root} was made with {row[0]}; starting over with {model_key}.")
+                self.clear()
+            with self.conn:
+                self.conn.execute("INSERT OR REPLACE INTO job (key, value) VALUES ('model', ?)", (model_key,))
+
+    def parts(self):
+        """Committed part paths, in commit order."""
+        with self.lock:
+            return [os.path.join(self.root, path) for (path,) in self.conn.execute("SELECT path FROM parts ORDER BY part")]
+
+    def rows(self):
+        with self.lock:
+            return self.conn.execute("SELECT COALESCE(SUM(rows), 0) FROM parts").fetchone()[0]
+
+    def done_keys(self, key_columns=("topic", "chunk_id")):
+        """Set of key tuples (default (topic, chunk_id)) already in committed parts."""
+        done = set()
+        for path in self.parts():
+            table = pq.read_table(path, columns=list(key_columns))
+            done.update(zip(*(table.column(name).to_pylist() for name in key_columns)))
+        return done
+
+    def commit(self, table: pa.Table):
+        """Write table as the next part-file, then record it."""
+        with self.lock:
+            part = self.conn.execute("SELECT COALESCE(MAX(part), -1) + 1 FROM parts").fetchone()[0]
+            name = f"part-{part:05d}.parquet"
+            tmp_path = os.path.join(self.root, "." + name + ".tmp")
+            pq.write_table(table, tmp_path, compression="SNAPPY", row_group_size=table.num_rows or None)
+            os.replace(tmp_path, os.path.join(self.root, name))
+            with self.conn:
+                self.conn.execute(
+                    "INSERT INTO parts (part, path, rows, committed_at) VALUES (?, ?, ?, ?)",
+                    (part, name, table.num_rows, time.time()),
+                )
+        return part
+
+    def finalize(self, output_path, row_group_size=8192, on_batch=None):
+        """
+        Compact the committed parts, in order, into one Parquet file
+        (written to a temporary name, then renamed over output_path).
+
+        :param on_batch: Called with every record batch written (e.g., to build an embedding matrix).
+        :return: Rows written.
+        """
+        paths = self.parts()
+        if not paths:
+            return 0
+        tmp_path = os.path.join(os.path.dirname(output_path) or ".", "." + os.path.basename(output_path) + ".tmp")
+        writer = pq.ParquetWriter(tmp_path, pq.read_schema(paths[0]), compression="SNAPPY")
+        rows, pending = 0, []
+
+        def write(batches):
+            table = pa.Table.from_batches(batches)
+            writer.write_table(table, row_group_size=row_group_size)
+            if on_batch is not None:
+                for batch in table.to_batches():
+                    on_batch(batch)
+
+        for path in paths:
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=row_group_size):
+                pending.append(batch)
+                rows += batch.num_rows
+                # Regroup so the output has full row groups regardless of part sizes
+                while sum(b.num_rows for b in pending) >= row_group_size:
+                    table = pa.Table.from_batches(pending)
+                    write(table.slice(0, row_group_size).to_batches())
+                    pending = table.slice(row_group_size).to_batches()
+        if pending:
+            write(pending)
+        writer.close()
+        os.replace(tmp_path, output_path)
+        return rows
+
+    def clear(self):
+        """Forget all progress and delete the part-files."""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM parts")
+            self.conn.execute("DELETE FROM job")
+            for name in os.listdir(self.root):
+                if name.endswith(".parquet") or name.endswith(".tmp"):
+                    os.remove(os.path.join(self.root, name))
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def remove(self):
+        """Delete the checkpoint directory (after a successful finalize)."""
+        self.close()
+        shutil.rmtree(self.root, ignore_errors=True)
@@ -0,0 +1,115 @@
+import re
+import unicodedata
+
+CID_PATTERN = re.compile(r"\(cid:\d+\)")
+TABLE_ROW_PATTERN = re.compile(r"^\s*(?:[-+]?\d[\d.,%±]*\s+){3,}[-+]?\d[\d.,%±]*\s*$")
+HYPHEN_BREAK_PATTERN = re.compile(r"(\w)-\n(\w)")
+
+
+def extract_text_layer(pdf_path):
+    """
+    Read the embedded text layer with pypdfium2 (already a docling dependency).
+
+    :return: (list of page texts, number of pages)
+    """
+    import pypdfium2 as pdfium
+
+    pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        pages = []
+        for page in pdf:
+            textpage = page.get_textpage()
+            try:
+                pages.append(textpage.get_text_range().replace("\r\n", "\n").replace("\r", "\n"))
+            finally:
+                textpage.close()
+                page.close()
+        return pages, len(pdf)
+    finally:
+        pdf.close()
+
+
+def text_to_markdown(pages):
+    """Join page texts into plain markdown paragraphs, undoing end-of-line hyphenation."""
+    text = "\n\n".join(page.strip() for page in pages if page.strip())
+    text = HYPHEN_BREAK_PATTERN.sub(r"\1\2", text)
+    return re.sub(r"\n{3,}", "\n\n", text) + "\n"
+
+
+def quality_metrics(text, num_pages):
+    """Cheap signals for whether a text layer can stand in for a layout-aware conversion."""
+    chars = len(text) or 1
+    garbled = (
+        text.count("\ufffd")
+        + len(CID_PATTERN.findall(text))
+        + sum(1 for c in text if "\ue000" <= c <= "\uf8ff" or (unicodedata.category(c) == "Cc" and c not in "\n\t"))
+    )
+    math = sum(1 for c in text if unicodedata.category(c) == "Sm" or "\u0391" <= c <= "\u03c9")
+    lines = [line for line in text.split("\n") if line.strip()]
+    table_rows = sum(1 for line in lines if TABLE_ROW_PATTERN.match(line))
+    words = text.split()
+    glued = sum(1 for w in words if len(w) > 25 and w.isalpha())
+
+    return {
+        "pages": num_pages,
+        "chars_per_page": len(text.strip()) / max(num_pages, 1),
+        "garbled_ratio": garbled / chars,
+        "math_ratio": math / chars,
+        "table_line_ratio": table_rows / max(len(lines), 1),
+        "glued_word_ratio": glued / max(len(words), 1),
+    }
+
+
+class FastPathExtractor:
+    """
+    First tier of the tiered converter: take the PDF's text layer as-is when
+    it looks like a clean, born-digital document, and escalate to docling
+    when it is sparse (scanned), garbled, equation-heavy or table-heavy.
+    """
+
+    def __init__(
+        self,
+        min_chars_per_page: int = 800,
+        max_garbled_ratio: float = 0.002,
+        max_math_ratio: float = 0.01,
+        max_table_line_ratio: float = 0.05,
+        max_glued_word_ratio: float = 0.01,
+    ):
+        self.min_chars_per_page = min_chars_per_page
+        self.max_garbled_ratio = max_garbled_ratio
+        self.max_math_ratio = max_math_ratio
+        self.max_table_line_ratio = max_table_line_ratio
+        self.max_glued_word_ratio = max_glued_word_ratio
+
+    def fingerprint(self):
+        """Identifies the thresholds, so conversion-cache keys change when they do."""
+        return "fastpath:" + ",".join(f"{k}={v}" for k, v in sorted(vars(self).items()))
+
+    def rejection_reasons(self, metrics):
+        reasons = []
+        if metrics["chars_per_page"] < self.min_chars_per_page:
+            reasons.append("sparse_text")
+        if metrics["garbled_ratio"] > self.max_garbled_ratio:
+            reasons.append("garbled_glyphs")
+        if metrics["math_ratio"] > self.max_math_ratio:
+            reasons.append("equations")
+        if metrics["table_line_ratio"] > self.max_table_line_ratio:
+            reasons.append("tables")
+        if metrics["glued_word_ratio"] > self.max_glued_word_ratio:
+            reasons.append("broken_spacing")
+        return reasons
+
+    def extract(self, pdf_path):
+        """
+        :return: (markdown or None, metrics). None means the document should be
+                 escalated to docling; metrics["reasons"] says why.
+        """
+        try:
+            pages, num_pages = extract_text_layer(pdf_path)
+        except Exception as e:
+            return None, {"reasons": [f"extract_failed: {type(e).__name__}"]}
+
+        markdown = text_to_markdown(pages)
+        metrics = quality_metrics(markdown, num_pages)
+        metrics["reasons"] = self.rejection_reasons(metrics)
+        return (None if metrics["reasons"] else markdown), metrics
@@ -0,0 +1,103 @@
+import os
+import time
+import requests
+
+PDF_HEADER = b"%PDF-"
+PDF_TRAILER = b"%%EOF"
+
+
+class DownloadError(Exception):
+    pass
+
+
+class PermanentDownloadError(DownloadError):
+    """The server answered with an error that retrying will not fix (e.g., 404)."""
+
+
+def is_complete_pdf(path, expected_size=None):
+    """
+    Cheap structural check for a fully written PDF.
+
+    :param expected_size: Byte size announced by the server, if known.
+    :return: True when the file has a PDF header, an %%EOF trailer near the
+             end, and (optionally) the expected size.
+    """
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return False
+    if size < len(PDF_HEADER) or (expected_size is not None and size != expected_size):
+        return False
+    with open(path, "rb") as f:
+        if f.read(len(PDF_HEADER)) != PDF_HEADER:
+            return False
+        f.seek(max(0, size - 2048))
+        return PDF_TRAILER in f.read()
+
+
+def _total_size(response, offset):
+    """Work out the full file size from Content-Range or Content-Length."""
+    content_range = response.headers.get("Content-Range")
+    if content_range and "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        return int(total) if total.isdigit() else None
+    length = response.headers.get("Content-Length")
+    if length is None:
+        return None
+    return int(length) + (offset if response.status_code == 206 else 0)
+
+
+def stream_download(url, dest, session=None, rate_limiter=None, retries=5, backoff=2.0,
+                    timeout=60, chunk_size=1 << 16):
+    """
+    Stream `url` to `dest` through `dest + ".part"`, resuming with an HTTP
+    Range request when a partial file is already on disk.
+
+    The part file is only renamed to `dest` after it passes `is_complete_pdf`,
+    so an interrupted or truncated transfer never looks finished.
+
+    :param rate_limiter: Object with an `acquire()` method called before every request.
+    :return: Number of retries that were needed.
+    """
+    session = session or requests.Session()
+    part = dest + ".part"
+    attempt = 0
+
+    while True:
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        try:
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+            with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                if response.status_code == 416:
+                    # Server has nothing past our offset; the part file may already be whole
+                    expected = None
+                elif response.status_code in (200, 206):
+                    if response.status_code == 200:
+                        offset = 0  # Range ignored; start over
+                    expected = _total_size(response, offset)
+                    with open(part, "ab" if offset else "wb") as f:
+                        for block in response.iter_content(chunk_size=chunk_size):
+                            f.write(block)
+                elif 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+                    raise PermanentDownloadError(f"HTTP {response.status_code} for {url}")
+                else:
+                    raise DownloadError(f"HTTP {response.status_code} for {url}")
+
+            if is_complete_pdf(part, expected):
+                os.replace(part, dest)
+                return attempt
+
+            if expected is None or os.path.getsize(part) >= expected:
+                # Whole body received but it is not a valid PDF; don't resume onto garbage
+                os.remove(part)
+            raise DownloadError(f"Incomplete or invalid PDF from {url}")
+
+        except PermanentDownloadError:
+            raise
+        except (requests.RequestException, DownloadError) as e:
+            attempt += 1
+            if attempt > retries:
+                raise DownloadError(f"Giving up on {url} after {retries} retries: {e}") from e
+            time.sleep(backoff * 2 ** (attempt - 1))
@@ -1,33 +1,12 @@
 ##------------------------------------------------------------------------------##
-## Load and preprocess CSV data
-from langchain_community.document_loaders.csv_loader import CSVLoader
-from langchain_core.documents import Document
+## Load chunks from the topic-partitioned Parquet chunk store
+from chunkstore import ChunkStore
+
+# Only the needed columns are read; pass topics=["stat.ML"] to open just that partition
+store = ChunkStore("arxiv_data/all_chunks")
+cleaned_data = store.documents()
 
-# 1. Initialize and load the data with the 'description' field
-loader = CSVLoader(
-    file_path='arxiv_data/all_chunks.csv',
-    content_columns=["chunk_text"],
-    metadata_columns=["topic", "chunk_id", "pdf_name"]
-)
-data = loader.load()
-
-# 2. Define a function to transform the documents
-def remove_key_from_content(documents, key):
-    new_documents = []
-    for doc in documents:
-        # Create a new Document object with the cleaned page_content
-        new_documents.append(
-            Document(
-                page_content=doc.page_content.replace(f'{key}: ', ''),
-                metadata=doc.metadata
-            )
-        )
-    return new_documents
-
-# 3. Apply the function to the loaded data
-cleaned_data = remove_key_from_content(data, 'chunk_text')
-
-# 4. Print the cleaned documents
+# Print the loaded documents
 for doc in cleaned_data:
     print(doc.metadata)
 
@@ -43,7 +22,7 @@ import pickle
 from langchain_community.retrievers import BM25Retriever
 from langchain_core.documents import Document
 
-# filtered_docs = [doc for doc in cleaned_data if doc.metadata.get("topic") == "stat.ML"]
+# filtered_docs = store.documents(topics=["stat.ML"])
 # documents = filtered_docs
 
 
@@ -1,33 +1,12 @@
 ##------------------------------------------------------------------------------##
-## Load and preprocess CSV data
-from langchain_community.document_loaders.csv_loader import CSVLoader
-from langchain_core.documents import Document
-
-# 1. Initialize and load the data with the 'description' field
-loader = CSVLoader(
-    file_path='arxiv_data/all_chunks.csv',
-    content_columns=["chunk_text"],
-    metadata_columns=["topic", "chunk_id", "pdf_name"]
-)
-data = loader.load()
-
-# 2. Define a function to transform the documents
-def remove_key_from_content(documents, key):
-    new_documents = []
-    for doc in documents:
-        # Create a new Document object with the cleaned page_content
-        new_documents.append(
-            Document(
-                page_content=doc.page_content.replace(f'{key}: ', ''),
-                metadata=doc.metadata
-            )
-        )
-    return new_documents
-
-# 3. Apply the function to the loaded data
-cleaned_data = remove_key_from_content(data, 'chunk_text')
-
-# 4. Print the cleaned documents
+## Load chunks from the topic-partitioned Parquet chunk store
+from chunkstore import ChunkStore
+
+# Only the needed columns are read; pass topics=["stat.ML"] to open just that partition
+store = ChunkStore("arxiv_data/all_chunks")
+cleaned_data = store.documents()
+
+# Print the loaded documents
 # for doc in cleaned_data:
 #     print(doc.metadata)
 
@@ -41,10 +20,16 @@ os.environ["OPENAI_API_KEY"] = "test"
 
 from langchain_openai import OpenAIEmbeddings
 from langchain_chroma import Chroma
-
-embedding = OpenAIEmbeddings(
-    model="text-embedding-qwen3-embedding-4b",
-    check_embedding_ctx_length=False
+from embcache import EmbeddingCache, CachedEmbeddings
+
+# Vectors already computed for identical text (stage 04, earlier runs, other sweeps) are reused
+embedding = CachedEmbeddings(
+    OpenAIEmbeddings(
+        model="text-embedding-qwen3-embedding-4b",
+        check_embedding_ctx_length=False
+    ),
+    EmbeddingCache("arxiv_data/cache/embeddings.sqlite"),
+    model_key="text-embedding-qwen3-embedding-4b",
 )
 
 # text = "LangChain is a framework for developing applications powered by language models."
@@ -61,36 +46,19 @@ embedding = OpenAIEmbeddings(
 #     print(d.page_content)
 
 ##------------------------------------------------------------------------------##
-# ## Create and populate Chroma vector store with filtered documents    
-# from langchain_chroma import Chroma
-# from tqdm import tqdm
+# ## Create and populate Chroma vector store from stage 04's precomputed embeddings
+# from chromaload import ChromaBulkLoader
 
-# vector_store = Chroma(
+# # Streams all_chunks_with_embeddings.parquet and upserts vectors, texts and metadata
+# # in large batches keyed by chunk_id; the embedding model is not called
+# loader = ChromaBulkLoader(
+#     persist_directory="./chroma_db",
 #     collection_name="arxiv",
-#     embedding_function=embedding,
-#     persist_directory="./chroma_db"
+#     embeddings_parquet="arxiv_data/all_chunks_with_embeddings.parquet",
 # )
 
-# print(f"Number of cleaned documents: {len(cleaned_data)}")
-
-
-# # Filter documents with topic = 'stat_ML'
-# filtered_docs = [doc for doc in cleaned_data if doc.metadata.get("topic") == "stat.ML"]
-
-# print(f"Number of filtered documents (topic='stat.ML'): {len(filtered_docs)}")
-
-# # Loop with tqdm progress bar
-# for doc in tqdm(filtered_docs, desc="Adding stat_ML documents"):
-#     try:
-#         vector_store.add_documents(
-#             documents=[doc],
-#             ids=[doc.metadata["chunk_id"]]
-#         )
-#     except Exception as e:
-#         print(f"⚠️ Error adding document {doc.metadata.get('chunk_id', 'unknown')}: {e}")
-
-
-# print("✅ All 'stat.ML' documents added to the vector store.")
+# # Only the stat.ML rows; skip_existing=True resumes an interrupted load
+# loader.load(topics=["stat.ML"], skip_existing=True)
 
 ##------------------------------------------------------------------------------##
 # ## Load existing Chroma vector store and perform similarity search
@@ -102,8 +70,14 @@ loaded_vector_store = Chroma(
 print(loaded_vector_store)
 
 
+from querycache import CachedVectorSearch
+
+# Repeated queries skip re-embedding and, while the collection is unchanged, the search itself
+search = CachedVectorSearch(loaded_vector_store, embedding, model_key="text-embedding-qwen3-embedding-4b")
+
 query = "Explain PopularityAdjusted Block Model (PABM)"
-docs = loaded_vector_store.similarity_search(query, k=2)
+docs = search.similarity_search(query, k=2)
+print(search.stats())
 
 
 print("--- Search Results from Loaded DB ---")
@@ -112,6 +86,20 @@ for doc in docs:
     print(f"Document: {doc.page_content}")
     print("-----------------------------------")
 
+##------------------------------------------------------------------------------##
+# ## Alternative: in-process IVF-PQ index over stage 04's embeddings (no Chroma)
+# from annindex import IVFPQIndex
+
+# # Build once from the Parquet file (IVFPQIndex.build("arxiv_data/ann")), then open memory-mapped
+# ann_index = IVFPQIndex("arxiv_data/ann")
+# print(ann_index.evaluate())  # recall@10 and latency per (nprobe, rerank)
+
+# # nprobe / rerank trade latency for recall
+# ann_retriever = ann_index.as_retriever(embedding, k=2, nprobe=16, rerank=100)
+# docs = ann_retriever.invoke(query)
+# search = CachedVectorSearch(ann_index, embedding, model_key="text-embedding-qwen3-embedding-4b")
+# docs = search.similarity_search(query, k=2, nprobe=16, rerank=100)
+
 ##------------------------------------------------------------------------------##
 ## Set up a LangChain pipeline with prompt template and LLM
 from langchain_openai import ChatOpenAI
@@ -0,0 +1,175 @@
+import os
+import csv
+import sqlite3
+import threading
+
+METADATA_FIELDS = [
+    "arxiv_id", "title", "authors", "published",
+    "updated", "categories", "abstract", "pdf_path"
+]
+
+
+class DownloadManifest:
+    """
+    SQLite index of downloaded papers, keyed by arxiv_id.
+
+    Paper metadata is stored once per arxiv_id; topic membership (and the
+    topic-local pdf_path) lives in a separate table so cross-listed papers
+    are not duplicated. The `blobs` table maps each arxiv_id to its copy in
+    the content-addressed PDFStore. `<topic>/metadata.csv` is exported from here.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: Location of the SQLite file (e.g., arxiv_data/manifest.sqlite).
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS papers (
+                arxiv_id TEXT PRIMARY KEY,
+                title TEXT, authors TEXT, published TEXT,
+                updated TEXT, categories TEXT, abstract TEXT
+            );
+            CREATE TABLE IF NOT EXISTS topic_papers (
+                topic TEXT NOT NULL,
+                arxiv_id TEXT NOT NULL REFERENCES papers(arxiv_id),
+                pdf_path TEXT,
+                PRIMARY KEY (topic, arxiv_id)
+            );
+            CREATE TABLE IF NOT EXISTS blobs (
+                arxiv_id TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                blob_path TEXT NOT NULL
+            );
+        """)
+
+    def has(self, topic, arxiv_id) -> bool:
+        """O(1) check whether a paper is already recorded for a topic."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM topic_papers WHERE topic = ? AND arxiv_id = ?",
+                (topic, arxiv_id),
+            ).fetchone()
+        return row is not None
+
+    def count(self, topic=None) -> int:
+        with self.lock:
+            if topic is None:
+                return self.conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM topic_papers WHERE topic = ?", (topic,)
+            ).fetchone()[0]
+
+    def upsert(self, topic, row):
+        """
+        Insert or update one paper.
+
+        :param row: Metadata list in METADATA_FIELDS order (as written to metadata.csv).
+        """
+        self.upsert_many(topic, [row])
+
+    def upsert_many(self, topic, rows):
+        rows = list(rows)
+        with self.lock, self.conn:
+            self.conn.executemany(
+                """
+                INSERT INTO papers (arxiv_id, title, authors, published, updated, categories, abstract)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(arxiv_id) DO UPDATE SET
+                    title = excluded.title, authors = excluded.authors,
+                    published = excluded.published, updated = excluded.updated,
+                    categories = excluded.categories, abstract = excluded.abstract
+                """,
+                [tuple(r[:7]) for r in rows],
+            )
+            self.conn.executemany(
+                """
+                INSERT INTO topic_papers (topic, arxiv_id, pdf_path) VALUES (?, ?, ?)
+                ON CONFLICT(topic, arxiv_id) DO UPDATE SET pdf_path = excluded.pdf_path
+                """,
+                [(topic, r[0], r[7]) for r in rows],
+            )
+
+    def blob_for(self, arxiv_id):
+        """Return (sha256, size, blob_path) for a paper, or None if it is not in the store."""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT sha256, size, blob_path FROM blobs WHERE arxiv_id = ?", (arxiv_id,)
+            ).fetchone()
+
+    def record_blob(self, arxiv_id, sha256, size, blob_path):
+        with self.lock, self.conn:
+            self.conn.execute(
+                """
+                INSERT INTO blobs (arxiv_id, sha256, size, blob_path) VALUES (?, ?, ?, ?)
+                ON CONFLICT(arxiv_id) DO UPDATE SET
+                    sha256 = excluded.sha256, size = excluded.size, blob_path = excluded.blob_path
+                """,
+                (arxiv_id, sha256, size, blob_path),
+            )
+
+    def blobs(self):
+        """Return every (arxiv_id, sha256, size, blob_path) in the store."""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT arxiv_id, sha256, size, blob_path FROM blobs ORDER BY arxiv_id"
+            ).fetchall()
+
+    def invalidate(self, arxiv_id):
+        """Forget a paper's blob and topic listings so the next run fetches it again; metadata is kept."""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM blobs WHERE arxiv_id = ?", (arxiv_id,))
+            self.conn.execute("DELETE FROM topic_papers WHERE arxiv_id = ?", (arxiv_id,))
+
+    def topics_by_paper(self):
+        """Return {arxiv_id: [(topic, pdf_path), ...]} so later stages can fan out per paper."""
+        papers = {}
+        with self.lock:
+            result = self.conn.execute(
+                "SELECT arxiv_id, topic, pdf_path FROM topic_papers ORDER BY arxiv_id, topic"
+            ).fetchall()
+        for arxiv_id, topic, pdf_path in result:
+            papers.setdefault(arxiv_id, []).append((topic, pdf_path))
+        return papers
+
+    def rows(self, topic=None):
+        """Yield metadata rows (METADATA_FIELDS order, plus topic) ordered by topic and arxiv_id."""
+        query = """
+            SELECT p.arxiv_id, p.title, p.authors, p.published, p.updated,
+                   p.categories, p.abstract, t.pdf_path, t.topic
+            FROM topic_papers t JOIN papers p USING (arxiv_id)
+        """
+        args = ()
+        if topic is not None:
+            query += " WHERE t.topic = ?"
+            args = (topic,)
+        query += " ORDER BY t.topic, p.arxiv_id"
+        with self.lock:
+            result = self.conn.execute(query, args).fetchall()
+        yield from result
+
+    def import_csv(self, topic, meta_file):
+        """Seed the manifest from a legacy append-only metadata.csv (duplicates collapse)."""
+        with open(meta_file, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            rows = [[r.get(k, "") or "" for k in METADATA_FIELDS] for r in reader if r.get("arxiv_id")]
+        self.upsert_many(topic, rows)
+        return len(rows)
+
+    def export_csv(self, topic, meta_file):
+        """Rewrite metadata.csv for a topic from the manifest (one row per paper)."""
+        tmp_file = meta_file + ".tmp"
+        with open(tmp_file, mode="w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(METADATA_FIELDS)
+            for row in self.rows(topic):
+                writer.writerow(row[:8])
+        os.replace(tmp_file, meta_file)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
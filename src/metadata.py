@@ -1,6 +1,7 @@
 import os
 import csv
 import pandas as pd
+from manifest import DownloadManifest, METADATA_FIELDS
 
 class ArxivMetadataCombiner:
     def __init__(self, save_dir: str = "arxiv_data", output_filename: str = "master_metadata.csv"):
@@ -12,6 +13,10 @@ class ArxivMetadataCombiner:
         self.output_path = os.path.join(save_dir, output_filename)
 
     def run(self):
+        manifest_path = os.path.join(self.save_dir, "manifest.sqlite")
+        if os.path.exists(manifest_path):
+            return self.run_from_manifest(manifest_path)
+
         all_dfs = []
         # iterate over subfolders (topics)
         for topic_folder in os.listdir(self.save_dir):
@@ -42,6 +47,21 @@ class ArxivMetadataCombiner:
         combined.to_csv(self.output_path, index=False, encoding="utf-8")
         print(f"✅ Combined metadata saved to {self.output_path}, total rows = {len(combined)}")
 
+    def run_from_manifest(self, manifest_path):
+        """Export the already de-duplicated manifest instead of re-reading every metadata.csv."""
+        manifest = DownloadManifest(manifest_path)
+        try:
+            combined = pd.DataFrame(list(manifest.rows()), columns=METADATA_FIELDS + ["topic"])
+        finally:
+            manifest.close()
+
+        if combined.empty:
+            print("❌ Manifest is empty. Nothing to combine.")
+            return
+
+        combined.to_csv(self.output_path, index=False, encoding="utf-8")
+        print(f"✅ Combined metadata saved to {self.output_path}, total rows = {len(combined)}")
+
 if __name__ == "__main__":
     combiner = ArxivMetadataCombiner(save_dir="arxiv_data", output_filename="master_metadata.csv")
     combiner.run()
@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from embcache import normalize_text
+
+
+class TTLCache:
+    """In-memory LRU cache whose entries also expire `ttl` seconds after they were stored."""
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 3600.0):
+        """
+        :param max_entries: Least recently used entries are evicted beyond this count.
+        :param ttl: Seconds an entry stays valid; None keeps entries until evicted.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[1] > self.ttl:
+                del self.entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expired": self.expired,
+        }
+
+
+def store_version(vector_store):
+    """
+    A value that changes whenever the vector store is written: IVFPQIndex.version(),
+    or for a persistent LangChain Chroma store the mtimes of its SQLite files plus
+    the collection's record count.
+    """
+    if hasattr(vector_store, "version"):
+        return vector_store.version()
+    parts = []
+    persist_directory = getattr(vector_store, "_persist_directory", None)
+    if persist_directory:
+        for name in ("chroma.sqlite3", "chroma.sqlite3-wal"):
+            path = os.path.join(persist_directory, name)
+            if os.path.exists(path):
+                parts.append(os.stat(path).st_mtime_ns)
+    collection = getattr(vector_store, "_collection", None)
+    if collection is not None:
+        parts.append(collection.count())
+    return tuple(parts)
+
+
+class CachedVectorSearch:
+    """
+    Two-level cache in front of a vector store's similarity search, for
+    evaluation loops that repeat the same queries.
+
+    Level 1 maps (model_key, normalized query text) to the query vector, so
+    repeated queries are not re-embedded. Level 2 maps (query vector, k,
+    filter, search options, store version) to the ids of the results, which
+    are fetched back with `get_by_ids`. When the store's version changes
+    (see store_version) level 2 is dropped, so results never outlive a
+    write to the collection. Both levels are TTL/LRU bounded.
+
+    Works with LangChain Chroma and with IVFPQIndex (annindex.py).
+    """
+
+    def __init__(
+        self, vector_store, embeddings, model_key: str, max_entries: int = 10000, ttl: float = 3600.0, version=None
+    ):
+        """
+        :param vector_store: Object with similarity_search_by_vector(embedding, k, ...) and get_by_ids(ids).
+        :param embeddings: Object with embed_query(text), e.g. CachedEmbeddings (persistent as well).
+        :param model_key: Embedding model the query vectors are cached under.
+        :param max_entries: Entries per level.
+        :param ttl: Seconds entries stay valid.
+        :param version: Callable returning the store version; defaults to store_version(vector_store).
+        """
+        self.vector_store = vector_store
+        self.embeddings = embeddings
+        self.model_key = model_key
+        self.version = version or (lambda: store_version(vector_store))
+        self.queries = TTLCache(max_entries, ttl)
+        self.results = TTLCache(max_entries, ttl)
+        self.current_version = None
+        self.invalidations = 0
+
+    def embed_query(self, query):
+        key = (self.model_key, normalize_text(query))
+        vector = self.queries.get(key)
+        if vector is None:
+            vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+            self.queries.put(key, vector)
+        return vector
+
+    def _check_version(self):
+        version = self.version()
+        if version != self.current_version:
+            if self.current_version is not None:
+                self.results.clear()
+                self.invalidations += 1
+            self.current_version = version
+        return version
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        """
+        :param filter: Metadata filter passed to the store (e.g., {"topic": "stat.ML"}).
+        :param kwargs: Further search options (e.g., nprobe, rerank for IVFPQIndex).
+        """
+        vector = self.embed_query(query)
+        version = self._check_version()
+        options = json.dumps({"filter": filter, **kwargs}, sort_keys=True, default=str)
+        key = (hashlib.sha256(vector.tobytes()).hexdigest(), k, options, json.dumps(version, default=str))
+
+        ids = self.results.get(key)
+        if ids is not None:
+            by_id = {doc.id: doc for doc in self.vector_store.get_by_ids(ids)}
+            if all(doc_id in by_id for doc_id in ids):
+                return [by_id[doc_id] for doc_id in ids]
+
+        if filter is not None:
+            kwargs["filter"] = filter
+        docs = self.vector_store.similarity_search_by_vector(vector.tolist(), k=k, **kwargs)
+        if all(doc.id is not None for doc in docs):
+            self.results.put(key, [doc.id for doc in docs])
+        return docs
+
+    def stats(self):
+        return {"queries": self.queries.stats(), "results": self.results.stats(), "invalidations": self.invalidations}
@@ -0,0 +1,73 @@
+import os
+import shutil
+import hashlib
+
+
+def sha256_file(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def link_or_copy(src, dest):
+    """Hardlink src to dest, falling back to a copy across filesystems."""
+    tmp_dest = dest + ".link"
+    if os.path.exists(tmp_dest):
+        os.remove(tmp_dest)
+    try:
+        os.link(src, tmp_dest)
+    except OSError:
+        shutil.copy2(src, tmp_dest)
+    os.replace(tmp_dest, dest)
+
+
+class PDFStore:
+    """
+    Content-addressed blob store for PDFs.
+
+    Each paper is stored once under `<root>/<sha256[:2]>/<sha256>.pdf`;
+    topic folders hold hardlinks to the blob, so cross-listed papers share
+    one copy on disk. The arxiv_id -> blob mapping lives in the manifest.
+    """
+
+    def __init__(self, root: str):
+        """
+        :param root: Directory for blobs (e.g., arxiv_data/store).
+        """
+        self.root = root
+        self.incoming_dir = os.path.join(root, "incoming")
+        os.makedirs(self.incoming_dir, exist_ok=True)
+
+    def blob_path(self, sha256):
+        return os.path.join(self.root, sha256[:2], f"{sha256}.pdf")
+
+    def incoming_path(self, arxiv_id):
+        """Scratch location for a download before it is hashed into the store."""
+        return os.path.join(self.incoming_dir, f"{arxiv_id}.pdf")
+
+    def put(self, path, move=False):
+        """
+        Add a file to the store.
+
+        :param path: File to add.
+        :param move: Move the file into the store instead of hardlinking it.
+        :return: (sha256, size, blob_path)
+        """
+        sha256 = sha256_file(path)
+        blob = self.blob_path(sha256)
+        if not os.path.exists(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            if move:
+                os.replace(path, blob)
+            else:
+                link_or_copy(path, blob)
+        elif move:
+            os.remove(path)
+        return sha256, os.path.getsize(blob), blob
+
+    def link(self, blob, dest):
+        """Materialize a blob at a topic-local path."""
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        link_or_copy(blob, dest)
@@ -0,0 +1,351 @@
+import os
+import csv
+import json
+import time
+import hashlib
+import importlib.util
+import multiprocessing
+from collections import deque
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from chunkstore import ChunkStore
+from chunkmanifest import ChunkManifest, chonkie_version
+from corpus import MarkdownCorpus, chunk_spans
+
+SUMMARY_FIELDS = [
+    "config", "version", "documents", "chunks", "tokens", "mean_tokens", "p50_tokens",
+    "p95_tokens", "max_tokens", "text_bytes", "chunk_seconds", "output_bytes",
+]
+
+
+def load_chunking():
+    """Import the stage-03 script (its filename is not a valid module name)."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "03-markdown2chunk.py")
+    spec = importlib.util.spec_from_file_location("markdown2chunk", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def percentile(values, q):
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))]
+
+
+class SharedTokenizer:
+    """
+    One tokenizer per process, shared by every configuration of a sweep.
+    Token counts are memoized, so the paragraphs and sentences that several
+    chunkers split a document into are only tokenized once.
+
+    Chunkers get `chunking`, chonkie's wrapper around the backend with its
+    counts routed through the memo: the recursive chunker also needs encode
+    and decode to cut pieces that have no split point into token windows.
+    """
+
+    def __init__(self, name: str = "gpt2", cache_size: int = 1 << 18):
+        """
+        :param name: Hugging Face tokenizer name (e.g., "gpt2").
+        :param cache_size: Number of distinct text pieces whose counts are kept.
+        """
+        from tokenizers import Tokenizer
+        from chonkie.tokenizer import AutoTokenizer
+
+        self.name = name
+        self.backend = Tokenizer.from_pretrained(name)
+        self.count = lru_cache(maxsize=cache_size)(self._count)
+        self.chunking = AutoTokenizer(self.backend)
+        self.chunking.count_tokens = self.count
+        self.chunking.count_tokens_batch = self.count_batch
+
+    def _count(self, text):
+        return len(self.backend.encode(text, add_special_tokens=False).ids)
+
+    def count_batch(self, texts):
+        return [self.count(text) for text in texts]
+
+
+class SweepConfig:
+    """One point of the grid: a chonkie chunker kind with its size and overlap."""
+
+    KINDS = ("recursive", "sentence", "token")
+
+    def __init__(self, kind: str, chunk_size: int, chunk_overlap: int = 0):
+        """
+        :param kind: "recursive", "sentence" or "token".
+        :param chunk_size: Maximum tokens per chunk.
+        :param chunk_overlap: Tokens shared by consecutive chunks (not used by "recursive").
+        """
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown chunker kind: {kind}")
+        self.kind = kind
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    @property
+    def name(self):
+        return f"{self.kind}-{self.chunk_size}-{self.chunk_overlap}"
+
+    def version(self, tokenizer_name):
+        """Short hash of everything that determines the output, used to version it on disk."""
+        payload = json.dumps(
+            {"config": vars(self), "tokenizer": tokenizer_name, "chonkie": chonkie_version()}, sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:12]
+
+    def build(self, tokenizer):
+        from chonkie import RecursiveChunker, SentenceChunker, TokenChunker
+
+        if self.kind == "recursive":
+            return RecursiveChunker(tokenizer=tokenizer.chunking, chunk_size=self.chunk_size)
+        if self.kind == "sentence":
+            return SentenceChunker(tokenizer=tokenizer.chunking, chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap)
+        # Token windows need encode/decode, so they get the shared tokenizer itself
+        return TokenChunker(tokenizer=tokenizer.backend, chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap)
+
+
+def build_grid(kinds=SweepConfig.KINDS, chunk_sizes=(256, 512, 1024), overlaps=(0, 64)):
+    """Every combination; overlaps >= chunk_size are skipped and "recursive" only gets overlap 0."""
+    configs = []
+    for kind in kinds:
+        for chunk_size in chunk_sizes:
+            for overlap in (overlaps if kind != "recursive" else (0,)):
+                if overlap < chunk_size:
+                    configs.append(SweepConfig(kind, chunk_size, overlap))
+    return configs
+
+
+# Per-process tokenizer and chunkers for the sweep; built once by _init_worker
+_worker_chunkers = None
+_worker_offsets = False
+
+
+def _init_worker(configs, tokenizer_name, offsets=False):
+    global _worker_chunkers, _worker_offsets
+    tokenizer = SharedTokenizer(tokenizer_name)
+    _worker_chunkers = [(config.name, config.build(tokenizer)) for config in configs]
+    _worker_offsets = offsets
+
+
+def _sweep_document(md_path):
+    """
+    Chunk one markdown file with every configuration; the file is read once.
+
+    :return: (results, error). results is {config name: (chunks, seconds)}
+             where chunks are [(chunk_text, token_count), ...], or
+             [(start, end, token_count), ...] byte spans in offset mode (no
+             text goes back to the parent). Errors are returned, not raised,
+             so one bad document is skipped instead of ending the sweep.
+    """
+    try:
+        with open(md_path, "r", encoding="utf-8") as f:
+            text = f.read()
+
+        results = {}
+        for name, chunker in _worker_chunkers:
+            started = time.perf_counter()
+            chunks = chunker(text)
+            if _worker_offsets:
+                chunks = chunk_spans(text, chunks)
+            else:
+                chunks = [(chunk.text, getattr(chunk, "token_count", None)) for chunk in chunks]
+            results[name] = (chunks, time.perf_counter() - started)
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+    return results, None
+
+
+class ChunkingSweep:
+    """
+    Run a grid of chunking configurations over the corpus in one pass.
+
+    Each document is read once and chunked by every configuration in the same
+    worker, sharing one tokenizer and its token-count cache; documents are
+    spread over a process pool, so all configurations progress in parallel.
+    Each configuration gets its own versioned ChunkStore under
+    `<save_dir>/sweeps/<name>@<version>/` with a stats.json next to it, and
+    `sweeps/summary.csv` compares them. stats.json records a fingerprint of
+    the markdown corpus, so outputs are only reused while the corpus is
+    unchanged.
+
+    With offsets=True every configuration stores only byte ranges into one
+    shared memory-mapped corpus (`<save_dir>/corpus`), so a sweep of N
+    configurations no longer keeps N copies of the corpus text.
+    """
+
+    def __init__(
+        self, save_dir="arxiv_data", configs=None, tokenizer="gpt2", num_workers=1, row_group_size=4096, offsets=False
+    ):
+        """
+        :param save_dir: Root directory containing topic subfolders with markdown files.
+        :param configs: SweepConfig list; defaults to build_grid().
+        :param tokenizer: Tokenizer name shared by all configurations.
+        :param num_workers: Processes to spread documents over.
+        :param row_group_size: Rows per Parquet row group in each output.
+        :param offsets: Store chunks as byte ranges into the shared corpus instead of text.
+        """
+        self.save_dir = save_dir
+        self.configs = configs or build_grid()
+        self.tokenizer = tokenizer
+        self.num_workers = num_workers
+        self.row_group_size = row_group_size
+        self.sweep_dir = os.path.join(save_dir, "sweeps")
+        self.offsets = offsets
+        self.corpus = MarkdownCorpus(os.path.join(save_dir, "corpus")) if offsets else None
+
+    def output_dir(self, config):
+        mode = "-offsets" if self.offsets else ""
+        return os.path.join(self.sweep_dir, f"{config.name}@{config.version(self.tokenizer)}{mode}")
+
+    def corpus_fingerprint(self, documents):
+        """Short hash of every paper's markdown sha256 and topics (hashes memoized in the stage-03 chunk manifest)."""
+        manifest = ChunkManifest(os.path.join(self.save_dir, "cache", "chunks.sqlite"))
+        try:
+            entries = sorted(
+                (pdf_name, manifest.md_sha256(listings[0][1]), sorted(topic for topic, _ in listings))
+                for pdf_name, listings in documents.items()
+            )
+        finally:
+            manifest.close()
+        return hashlib.sha256(json.dumps(entries).encode("utf-8")).hexdigest()[:12]
+
+    def _up_to_date(self, config, corpus):
+        path = os.path.join(self.output_dir(config), "stats.json")
+        if not os.path.exists(path):
+            return False
+        with open(path, encoding="utf-8") as f:
+            return json.load(f).get("corpus") == corpus
+
+    def _results(self, documents, configs):
+        """Yield (pdf_name, listings, (results, error)) in document order (bounded in-flight window)."""
+        if self.num_workers <= 1:
+            _init_worker(configs, self.tokenizer, self.offsets)
+            for pdf_name, listings in documents:
+                yield pdf_name, listings, _sweep_document(listings[0][1])
+            return
+
+        with ProcessPoolExecutor(
+            max_workers=self.num_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(configs, self.tokenizer, self.offsets),
+        ) as pool:
+            window = deque()
+            for pdf_name, listings in documents:
+                window.append((pdf_name, listings, pool.submit(_sweep_document, listings[0][1])))
+                if len(window) >= self.num_workers * 4:
+                    pdf_name, listings, future = window.popleft()
+                    yield pdf_name, listings, future.result()
+            while window:
+                pdf_name, listings, future = window.popleft()
+                yield pdf_name, listings, future.result()
+
+    def _stats(self, config, corpus, documents, token_counts, text_bytes, seconds, output_dir):
+        output_bytes = sum(
+            os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(output_dir) for name in names
+        )
+        return {
+            "config": config.name,
+            "version": config.version(self.tokenizer),
+            "corpus": corpus,
+            "documents": documents,
+            "chunks": len(token_counts),
+            "tokens": sum(token_counts),
+            "mean_tokens": round(sum(token_counts) / len(token_counts), 2) if token_counts else 0,
+            "p50_tokens": percentile(token_counts, 50),
+            "p95_tokens": percentile(token_counts, 95),
+            "max_tokens": max(token_counts, default=0),
+            "text_bytes": text_bytes,
+            "chunk_seconds": round(seconds, 3),
+            "output_bytes": output_bytes,
+        }
+
+    def run(self, force=False):
+        """
+        :param force: Re-run configurations whose versioned output already exists.
+        :return: Stats dicts for every configuration in the grid.
+        """
+        documents = load_chunking().collect_markdown(self.save_dir)
+        corpus = self.corpus_fingerprint(documents)
+        todo = [c for c in self.configs if force or not self._up_to_date(c, corpus)]
+        if len(todo) < len(self.configs):
+            print(f"🔍 Skipping {len(self.configs) - len(todo)} configurations with up-to-date outputs.")
+
+        if todo:
+            stores = {config.name: ChunkStore(os.path.join(self.output_dir(config), "chunks")) for config in todo}
+            for store in stores.values():
+                store.link_corpus(self.corpus.root if self.offsets else None)
+            writers = {config.name: {} for config in todo}
+            token_counts = {config.name: [] for config in todo}
+            text_bytes = {config.name: 0 for config in todo}
+            seconds = {config.name: 0.0 for config in todo}
+            skipped = 0
+
+            started = time.perf_counter()
+            for doc_idx, (pdf_name, listings, (results, error)) in enumerate(self._results(documents.items(), todo), start=1):
+                if error is not None:
+                    # Leave the paper out of every configuration so they stay comparable
+                    print(f"⚠️ Skipping {pdf_name}: {error}")
+                    skipped += 1
+                    continue
+                if self.offsets:
+                    with open(listings[0][1], "r", encoding="utf-8") as f:
+                        doc_id, base = self.corpus.add(pdf_name, f.read())
+
+                for name, (chunks, elapsed) in results.items():
+                    seconds[name] += elapsed
+                    token_counts[name].extend(chunk[-1] or 0 for chunk in chunks)
+                    if self.offsets:
+                        text_bytes[name] += sum(end - start for start, end, _ in chunks)
+                        chunks = [(doc_id, base + start, base + end, token_count) for start, end, token_count in chunks]
+                    else:
+                        text_bytes[name] += sum(len(chunk_text.encode("utf-8")) for chunk_text, _ in chunks)
+                    for topic, _ in listings:
+                        if topic not in writers[name]:
+                            writers[name][topic] = stores[name].writer(topic, self.row_group_size)
+                        writers[name][topic].write(pdf_name, chunks)
+                if doc_idx % 100 == 0:
+                    print(f"Processed {doc_idx}/{len(documents)} documents...")
+
+            for config in todo:
+                for writer in writers[config.name].values():
+                    writer.commit()
+                # A re-run over a changed corpus must not keep partitions of topics that are gone
+                for topic in set(stores[config.name].topics()) - set(writers[config.name]):
+                    stores[config.name].remove(topic)
+                stats = self._stats(
+                    config, corpus, len(documents) - skipped, token_counts[config.name], text_bytes[config.name],
+                    seconds[config.name], self.output_dir(config),
+                )
+                with open(os.path.join(self.output_dir(config), "stats.json"), "w", encoding="utf-8") as f:
+                    json.dump(stats, f, indent=2)
+            print(
+                f"✅ Swept {len(todo)} configurations over {len(documents) - skipped} documents "
+                f"({skipped} skipped) in {time.perf_counter() - started:.1f}s."
+            )
+
+        all_stats = []
+        for config in self.configs:
+            with open(os.path.join(self.output_dir(config), "stats.json"), encoding="utf-8") as f:
+                all_stats.append(json.load(f))
+
+        os.makedirs(self.sweep_dir, exist_ok=True)
+        with open(os.path.join(self.sweep_dir, "summary.csv"), "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(all_stats)
+        return all_stats
+
+    def report(self, all_stats):
+        for stats in all_stats:
+            print(
+                f"{stats['config']:>20}  chunks={stats['chunks']:>7}  mean={stats['mean_tokens']:>7}  "
+                f"p95={stats['p95_tokens']:>5}  {stats['chunk_seconds']:8.2f}s  {stats['output_bytes'] / 1e6:8.1f} MB"
+            )
+
+
+if __name__ == "__main__":
+    sweep = ChunkingSweep(save_dir="arxiv_data", num_workers=max(1, (os.cpu_count() or 2) // 2))
+    sweep.report(sweep.run())